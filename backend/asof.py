@@ -0,0 +1,36 @@
+import numpy as np
+
+# Horizons the judge knows how to grade, in minutes
+HORIZONS = {"15m": 15, "1h": 60, "4h": 240}
+DEFAULT_HORIZON = HORIZONS["1h"]
+
+ASOF_TOLERANCE = 600   # Seconds: the as-of tick must be at most this far before the target time
+ASOF_EXPIRY = 86400    # Seconds past the target after which an ungradable prediction is closed
+
+def to_epoch_seconds(datetimes):
+    """Naive datetimes -> int64 seconds, consistently for ticks and predictions."""
+    return np.array(datetimes, dtype="datetime64[s]").astype(np.int64)
+
+def asof_prices(tick_times, tick_prices, query_times, horizons, tolerance: int = ASOF_TOLERANCE):
+    """
+    As-of join: for every query time t and horizon h, the price of the last tick at or
+    before t + h. `tick_times` must be sorted ascending; all times and horizons are in
+    seconds. Returns a (len(query_times), len(horizons)) array, NaN where no tick lands
+    within `tolerance` of the target.
+    """
+    query_times = np.asarray(query_times, dtype=np.int64)
+    horizons = np.asarray(horizons, dtype=np.int64)
+    out = np.full((len(query_times), len(horizons)), np.nan)
+    if len(tick_times) == 0 or len(query_times) == 0:
+        return out
+
+    tick_times = np.asarray(tick_times, dtype=np.int64)
+    tick_prices = np.asarray(tick_prices, dtype=np.float64)
+
+    targets = query_times[:, None] + horizons[None, :]
+    idx = np.searchsorted(tick_times, targets, side="right") - 1
+    found = np.clip(idx, 0, None)
+
+    valid = (idx >= 0) & ((targets - tick_times[found]) <= tolerance)
+    out[valid] = tick_prices[found[valid]]
+    return out
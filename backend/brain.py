@@ -1,9 +1,14 @@
 import joblib
+import re
 import numpy as np
+from datetime import datetime, timedelta
 from pathlib import Path
+from sqlalchemy import and_, case, func, select
+from sqlalchemy.orm import aliased
 from sklearn.pipeline import Pipeline
-from models import InvestorBehavior, PredictionLog, Stock
+from models import InvestorBehavior, Stock
 from lucy import text as lucy_text  # Your custom legacy logic
+from scoreboard import scoreboard
 
 # Load the model once
 BASE_DIR = Path(__file__).resolve().parent
@@ -16,8 +21,7 @@ try:
     msg_bundle = joblib.load(TEXT_MODEL_PATH)
     msg_classifier = msg_bundle['pipeline']
     # Load the vocabulary translator
-    v_data = lucy_text.readvocab(VOCAB_PATH)
-    vocab, vocabtf, vocabidf = v_data[0], v_data[1], v_data[2]
+    vocabulary = lucy_text.Vocabulary.fromFile(VOCAB_PATH)
 except Exception as e:
     print(f"⚠️ Social Lobe failed to load: {e}")
     msg_classifier = None
@@ -34,32 +38,50 @@ except Exception as e:
 
 # --- EXPORTED FUNCTIONS ---
 
-def classify_user_intent(message: str):
-    INTENT_KEYWORDS = {
-        "MARKET": ["price", "chart", "analysis", "technical", "prediction", "indicators", "target", "news", "opinion", "sentiment", "feeling", "social", "twitter", "hype"],
-        "GREETING": ["hello", "hi", "hey", "lucy", "morning", "help"],
-        "GLOBAL_KEYWORDS": ["market", "everything", "all stocks", "overall", "crypto world"]
-    }
-    text_lower = message.lower()
-
-    if any(kw in text_lower for kw in INTENT_KEYWORDS["MARKET"]):
-        return "market_query"
-    
-    if any(kw in text_lower for kw in INTENT_KEYWORDS["GREETING"]):
-        return "general_chat"
-    
-    if any(kw in text_lower for kw in INTENT_KEYWORDS["GLOBAL_KEYWORDS"]):
-        return "global_market_query"
+# Keyword routes in priority order: a message containing any "MARKET" keyword is a market query
+# even if it also greets Lucy. Keywords match as substrings, anywhere in the lowered message.
+INTENT_KEYWORDS = [
+    ("market_query", ["price", "chart", "analysis", "technical", "prediction", "indicators", "target", "news", "opinion", "sentiment", "feeling", "social", "twitter", "hype"]),
+    ("general_chat", ["hello", "hi", "hey", "lucy", "morning", "help"]),
+    ("global_market_query", ["market", "everything", "all stocks", "overall", "crypto world"])
+]
+# One zero-width lookahead per position, so overlapping keywords ("hi" inside "everything") are all seen.
+# Each intent is a numbered group, letting match.lastindex name the route in one pass.
+_INTENT_MATCHER = re.compile(
+    "(?=" + "|".join(f"({'|'.join(map(re.escape, keywords))})" for _, keywords in INTENT_KEYWORDS) + ")"
+)
+
+def _keyword_intent(text_lower: str):
+    best = None
+    for match in _INTENT_MATCHER.finditer(text_lower):
+        rank = match.lastindex - 1
+        if best is None or rank < best:
+            best = rank
+            if best == 0:
+                break
+    return INTENT_KEYWORDS[best][0] if best is not None else None
+
+def classify_user_intents(messages: list):
+    """
+    Batch intent classification: keyword routes first, then one vectorize-and-predict
+    pass of the SVC pipeline over every message no keyword claimed.
+    """
+    intents = [_keyword_intent(message.lower()) for message in messages]
+    pending = [i for i, intent in enumerate(intents) if intent is None]
 
-    """Translates text into an intent (Market vs General)."""
-    if msg_classifier:
+    if pending and msg_classifier:
         try:
-            fv = lucy_text.genfeatureVectorFromString(message, vocab, vocabidf)
-            prediction = msg_classifier.predict([fv])[0]
-            return "market_query" if int(prediction) == 1 else "general_chat"
+            X = vocabulary.transform([messages[i] for i in pending])
+            for i, prediction in zip(pending, msg_classifier.predict(lucy_text.toPipelineInput(X, msg_bundle))):
+                intents[i] = "market_query" if int(prediction) == 1 else "general_chat"
         except Exception as e:
             print(f"ML Classification Error: {e}")
-    return "general_chat" # Default fallback
+
+    return [intent or "general_chat" for intent in intents] # Default fallback
+
+def classify_user_intent(message: str):
+    """Translates text into an intent (Market vs General)."""
+    return classify_user_intents([message])[0]
 
 def prepare_market_features(prices: list):
     """Normalizes price data into a feature vector."""
@@ -69,11 +91,13 @@ def prepare_market_features(prices: list):
     
     return ((prices_array - mean) / std).flatten()
 
-def get_market_prediction(db, price_data, symbol, sentiment_text="Neutral"):
+def get_market_prediction(db, price_data, symbol, sentiment_text="Neutral", divergence_report=None):
     try:
         # 1. Get the Math-based Divergence Analysis first
         # This tells us exactly WHAT the whales are doing vs Price
-        divergence_report = analyze_divergence(db, symbol)
+        # (async callers compute it with analyze_divergence_async and pass it in)
+        if divergence_report is None:
+            divergence_report = analyze_divergence(db, symbol)
         
         # 2. Run your SVC Model (The "Social Lobe")
         # This tells us the "Vibe" of the market sentiment
@@ -101,72 +125,85 @@ def get_market_prediction(db, price_data, symbol, sentiment_text="Neutral"):
         return "Neutral", 0.0, "System re-calibrating mining parameters."
 
 def get_agent_stats(db, symbol):
-    # Only count predictions where we actually checked the result
-    verified_query = db.query(PredictionLog).filter(
-        PredictionLog.symbol == symbol,
-        PredictionLog.was_evaluated == True
-    )
-    
-    total_trades = verified_query.count()
-    wins = verified_query.filter(PredictionLog.was_correct == True).count()
-    streak = get_streak(db, symbol)
-    
-    win_rate = (wins / total_trades * 100) if total_trades > 0 else 0
-    return round(win_rate, 2), total_trades, streak
-
-def get_streak(db, symbol):
-    # Get the last 10 evaluated predictions, newest first
-    recent = db.query(PredictionLog).filter(
-        PredictionLog.symbol == symbol,
-        PredictionLog.was_evaluated == True
-    ).order_by(PredictionLog.timestamp.desc()).limit(10).all()
-
-    streak = 0
-    if not recent: return 0
-    
-    first_result = recent[0].was_correct
-    for p in recent:
-        if p.was_correct == first_result:
-            streak += 1
-        else:
-            break
-    return streak if first_result else -streak # Positive for win streak, negative for loss
+    # O(1) read of the scoreboard the judge maintains, instead of re-counting PredictionLog
+    return scoreboard.stats(db, symbol)
+
+async def get_agent_stats_async(db, symbol):
+    return await scoreboard.stats_async(db, symbol)
 
 # market.py or analysis.py
-from sqlalchemy import func
-from datetime import datetime, timedelta
+INSUFFICIENT_DIVERGENCE = "Neutral (Insufficient Data)"
 
-def analyze_divergence(db, symbol: str):
+def _divergence_stmt(symbols=None):
     """
-    Compares the last 24h Price Delta with the last 24h Whale Net Flow.
-    Returns a sentiment signal for Lucy's brain.
+    One aggregate statement for the 24h divergence inputs of every symbol (or just `symbols`):
+    tick count, first/last price and the Cold Storage / Exchange Inflow volume sums.
     """
     one_day_ago = datetime.now() - timedelta(hours=24)
+    price_window = [Stock.datetime >= one_day_ago]
+    flow_window = [InvestorBehavior.timestamp >= one_day_ago]
+    if symbols is not None:
+        price_window.append(Stock.symbol.in_(symbols))
+        flow_window.append(InvestorBehavior.symbol.in_(symbols))
+
+    bounds = (
+        select(
+            Stock.symbol,
+            func.count().label("ticks"),
+            func.min(Stock.datetime).label("first_dt"),
+            func.max(Stock.datetime).label("last_dt")
+        )
+        .where(*price_window)
+        .group_by(Stock.symbol)
+        .cte("bounds")
+    )
+    flows = (
+        select(
+            InvestorBehavior.symbol,
+            func.sum(case((InvestorBehavior.flow_type == "Cold Storage", InvestorBehavior.volume), else_=0)).label("inflow"), # Bullish move
+            func.sum(case((InvestorBehavior.flow_type == "Exchange Inflow", InvestorBehavior.volume), else_=0)).label("outflow") # Bearish move
+        )
+        .where(*flow_window)
+        .group_by(InvestorBehavior.symbol)
+        .cte("flows")
+    )
 
-    # 1. Calculate Price Delta
-    recent_prices = db.query(Stock).filter(Stock.symbol == symbol, Stock.datetime >= one_day_ago)\
-                      .order_by(Stock.datetime.asc()).all()
-    
-    if len(recent_prices) < 2: return "Neutral (Insufficient Data)"
+    first, last = aliased(Stock), aliased(Stock)
+    return (
+        select(
+            bounds.c.symbol,
+            bounds.c.ticks,
+            first.price.label("first_price"),
+            last.price.label("last_price"),
+            func.coalesce(flows.c.inflow, 0).label("inflow"),
+            func.coalesce(flows.c.outflow, 0).label("outflow")
+        )
+        .select_from(bounds)
+        .join(first, and_(first.symbol == bounds.c.symbol, first.datetime == bounds.c.first_dt))
+        .join(last, and_(last.symbol == bounds.c.symbol, last.datetime == bounds.c.last_dt))
+        .outerjoin(flows, flows.c.symbol == bounds.c.symbol)
+    )
+
+def _divergence_reports(rows, symbols):
+    reports = {r.symbol: divergence_signal(r.ticks, r.first_price, r.last_price, r.inflow, r.outflow) for r in rows}
+    if symbols is None:
+        return reports
+    return {symbol: reports.get(symbol, INSUFFICIENT_DIVERGENCE) for symbol in symbols}
+
+def divergence_signal(ticks, price_start, price_end, inflow, outflow):
+    """
+    Compares the 24h Price Delta with the 24h Whale Net Flow.
+    Returns a sentiment signal for Lucy's brain.
+    """
+    if ticks < 2: return INSUFFICIENT_DIVERGENCE
     
-    price_start = float(recent_prices[0].price)
-    price_end = float(recent_prices[-1].price)
+    # 1. Calculate Price Delta
+    price_start = float(price_start)
+    price_end = float(price_end)
     price_delta_pct = ((price_end - price_start) / price_start) * 100
 
     # 2. Calculate Whale Net Flow (Accumulation vs Distribution)
-    inflow = db.query(func.sum(InvestorBehavior.volume)).filter(
-        InvestorBehavior.symbol == symbol,
-        InvestorBehavior.flow_type == "Cold Storage", # Bullish move
-        InvestorBehavior.timestamp >= one_day_ago
-    ).scalar() or 0
-
-    outflow = db.query(func.sum(InvestorBehavior.volume)).filter(
-        InvestorBehavior.symbol == symbol,
-        InvestorBehavior.flow_type == "Exchange Inflow", # Bearish move
-        InvestorBehavior.timestamp >= one_day_ago
-    ).scalar() or 0
-
-    net_flow = inflow - outflow
+    net_flow = float(inflow or 0) - float(outflow or 0)
 
     # 3. DIVERGENCE LOGIC
     # CASE A: Bearish Divergence (Price Up, Whales Selling)
@@ -181,53 +218,24 @@ def analyze_divergence(db, symbol: str):
     elif price_delta_pct > 0 and net_flow > 0:
         return "✅ BULLISH CONFIRMATION: Market and whales are aligned in accumulation."
 
-    return "Neutral: Market noise."# market.py or analysis.py
-from sqlalchemy import func
-from datetime import datetime, timedelta
+    return "Neutral: Market noise."
 
 def analyze_divergence(db, symbol: str):
     """
     Compares the last 24h Price Delta with the last 24h Whale Net Flow.
     Returns a sentiment signal for Lucy's brain.
     """
-    one_day_ago = datetime.now() - timedelta(hours=24)
-
-    # 1. Calculate Price Delta
-    recent_prices = db.query(Stock).filter(Stock.symbol == symbol, Stock.datetime >= one_day_ago)\
-                      .order_by(Stock.datetime.asc()).all()
-    
-    if len(recent_prices) < 2: return "Neutral (Insufficient Data)"
-    
-    price_start = float(recent_prices[0].price)
-    price_end = float(recent_prices[-1].price)
-    price_delta_pct = ((price_end - price_start) / price_start) * 100
-
-    # 2. Calculate Whale Net Flow (Accumulation vs Distribution)
-    inflow = db.query(func.sum(InvestorBehavior.volume)).filter(
-        InvestorBehavior.symbol == symbol,
-        InvestorBehavior.flow_type == "Cold Storage", # Bullish move
-        InvestorBehavior.timestamp >= one_day_ago
-    ).scalar() or 0
-
-    outflow = db.query(func.sum(InvestorBehavior.volume)).filter(
-        InvestorBehavior.symbol == symbol,
-        InvestorBehavior.flow_type == "Exchange Inflow", # Bearish move
-        InvestorBehavior.timestamp >= one_day_ago
-    ).scalar() or 0
-
-    net_flow = inflow - outflow
-
-    # 3. DIVERGENCE LOGIC
-    # CASE A: Bearish Divergence (Price Up, Whales Selling)
-    if price_delta_pct > 3.0 and net_flow < 0:
-        return "⚠️ BEARISH DIVERGENCE: Price is pumping, but whales are exiting. Potential trap."
+    return analyze_divergence_many(db, [symbol])[symbol]
 
-    # CASE B: Bullish Divergence (Price Down, Whales Buying)
-    elif price_delta_pct < -3.0 and net_flow > 0:
-        return "🚀 BULLISH DIVERGENCE: Price is dipping, but whales are accumulating. Strong buy signal."
+def analyze_divergence_many(db, symbols=None):
+    """Divergence reports for many symbols (all that traded in 24h if None) in one round trip."""
+    rows = db.execute(_divergence_stmt(symbols)).all()
+    return _divergence_reports(rows, symbols)
 
-    # CASE C: Confirmation (Both moving together)
-    elif price_delta_pct > 0 and net_flow > 0:
-        return "✅ BULLISH CONFIRMATION: Market and whales are aligned in accumulation."
+async def analyze_divergence_async(db, symbol: str):
+    """Async twin of analyze_divergence for AsyncSession callers."""
+    return (await analyze_divergence_many_async(db, [symbol]))[symbol]
 
-    return "Neutral: Market noise."
\ No newline at end of file
+async def analyze_divergence_many_async(db, symbols=None):
+    rows = (await db.execute(_divergence_stmt(symbols))).all()
+    return _divergence_reports(rows, symbols)
@@ -0,0 +1,194 @@
+import asyncio
+import fcntl
+import os
+from datetime import datetime
+import msgpack
+from price_cache import TickerSnapshot, price_cache, ticker_board
+
+LUCY_BUS_PATH = os.getenv("LUCY_BUS_PATH", "/tmp/lucy-bus.sock")
+BUS_MAX_FOLLOWER_BUFFER = 8 * 1024 * 1024 # A follower this far behind is cut off and reconnects fresh
+BUS_LEAD_RETRY_SECONDS = 10.0 # Pause after a failed takeover (e.g. DB down) before bidding for the lock again
+
+class BroadcastBackend:
+    """
+    Same broadcast/publish/publish_tickers surface as ConnectionManager, handed to the sync
+    tasks in its place. The backend decides which workers see each event; every worker then
+    delivers it to the sockets its own ConnectionManager holds.
+    """
+    is_leader = True
+
+    def __init__(self, manager):
+        self.manager = manager
+
+    async def start(self, on_leader):
+        """Runs `on_leader` (scheduler, stream engine) in the one worker that should own them."""
+        await on_leader()
+
+    async def stop(self):
+        pass
+
+    async def broadcast(self, message: str):
+        await self._emit({"op": "broadcast", "message": message})
+
+    async def publish(self, message: dict):
+        await self._emit({"op": "publish", "message": message})
+
+    async def publish_tickers(self, snapshot: TickerSnapshot):
+        await self._emit({"op": "tickers", "snapshot": list(snapshot)})
+
+    async def share_ticks(self, ticks: list):
+        # The emitting worker already recorded these; only other workers need them
+        await self._relay({"op": "ticks", "ticks": [(s, p, dt.timestamp()) for s, p, dt in ticks]})
+
+    async def _emit(self, event: dict):
+        await self._deliver(event)
+        await self._relay(event)
+
+    async def _relay(self, event: dict):
+        pass
+
+    async def _deliver(self, event: dict):
+        op = event["op"]
+        if op == "broadcast":
+            await self.manager.broadcast(event["message"])
+        elif op == "publish":
+            await self.manager.publish(event["message"])
+        elif op == "tickers":
+            snapshot = TickerSnapshot(*event["snapshot"])
+            # Followers never run the sync, so their /tickers endpoint serves the relayed snapshot
+            if ticker_board.current.version != snapshot.version:
+                ticker_board.current = snapshot
+            await self.manager.publish_tickers(snapshot)
+        elif op == "ticks":
+            price_cache.record([(s, p, datetime.fromtimestamp(ts)) for s, p, ts in event["ticks"]])
+
+class InProcessBroadcast(BroadcastBackend):
+    """Single worker: events go straight to this process's sockets."""
+
+class UnixSocketBus(BroadcastBackend):
+    """
+    Leader/follower relay over a local unix socket. The worker that wins an flock on
+    `path + ".lock"` runs the scheduler and serves the socket; the others connect and replay
+    every event to their own clients, retrying for the lock whenever the leader goes away.
+    """
+    def __init__(self, manager, path: str = LUCY_BUS_PATH, retry_delay: float = 1.0):
+        super().__init__(manager)
+        self.path = path
+        self.lock_path = path + ".lock"
+        self.retry_delay = retry_delay
+        self.is_leader = False
+        self._on_leader = None
+        self._lock_file = None
+        self._server = None
+        self._followers = set()
+        self._follow_task = None
+        self._lead_failed = False
+
+    async def start(self, on_leader):
+        self._on_leader = on_leader
+        if not await self._try_lead():
+            self._follow_task = asyncio.create_task(self._follow())
+
+    async def stop(self):
+        if self._follow_task:
+            self._follow_task.cancel()
+        self._resign()
+
+    def _resign(self):
+        for writer in list(self._followers):
+            writer.close()
+        self._followers.clear()
+        if self._server:
+            self._server.close()
+            self._server = None
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+        if self._lock_file:
+            self._lock_file.close() # Releases the flock; a follower takes over
+            self._lock_file = None
+        self.is_leader = False
+
+    def _acquire_lock(self):
+        lock_file = open(self.lock_path, "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    async def _try_lead(self):
+        if not self._acquire_lock():
+            return False
+        if os.path.exists(self.path):
+            os.unlink(self.path) # Left behind by a leader that died
+        self._server = await asyncio.start_unix_server(self._serve_follower, path=self.path)
+        self.is_leader = True
+        print(f"👑 Bus: worker {os.getpid()} leads, relaying on {self.path}")
+        try:
+            await self._on_leader()
+        except Exception as e:
+            # Holding the lock without running the loops would stall every worker; let someone retry
+            print(f"🚨 Bus: worker {os.getpid()} could not start the leader loops ({type(e).__name__}: {e}), stepping down.")
+            self._resign()
+            self._lead_failed = True
+            return False
+        return True
+
+    async def _serve_follower(self, reader, writer):
+        self._followers.add(writer)
+        try:
+            await reader.read() # Followers never send; EOF means they left
+        except ConnectionError:
+            pass
+        finally:
+            self._followers.discard(writer)
+            writer.close()
+
+    async def _relay(self, event: dict):
+        if not self._followers:
+            return
+        body = msgpack.packb(event, use_bin_type=True)
+        frame = len(body).to_bytes(4, "big") + body # Encoded once for every follower
+        for writer in list(self._followers):
+            if writer.is_closing() or writer.transport.get_write_buffer_size() > BUS_MAX_FOLLOWER_BUFFER:
+                self._followers.discard(writer)
+                writer.close()
+                continue
+            writer.write(frame)
+
+    async def _follow(self):
+        while True:
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.path)
+            except OSError:
+                pass # Leader not listening yet, or gone
+            else:
+                print(f"📡 Bus: worker {os.getpid()} following {self.path}")
+                try:
+                    while True:
+                        header = await reader.readexactly(4)
+                        body = await reader.readexactly(int.from_bytes(header, "big"))
+                        try:
+                            await self._deliver(msgpack.unpackb(body, raw=False))
+                        except Exception as e:
+                            # One bad frame must not end relaying for this worker
+                            print(f"⚠️ Bus: dropped a frame ({type(e).__name__}: {e})")
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    print(f"⚠️ Bus: lost the leader on {self.path}")
+                finally:
+                    writer.close()
+
+            # Whoever grabs the lock first takes over the scheduler
+            if await self._try_lead():
+                return
+            await asyncio.sleep(BUS_LEAD_RETRY_SECONDS if self._lead_failed else self.retry_delay)
+            self._lead_failed = False
+
+def create_broadcast_backend(manager, kind: str = None):
+    """LUCY_BROADCAST_BACKEND=unix shares one scheduler across uvicorn workers; "local" is a single worker."""
+    kind = kind or os.getenv("LUCY_BROADCAST_BACKEND", "local")
+    if kind == "unix":
+        return UnixSocketBus(manager, LUCY_BUS_PATH)
+    return InProcessBroadcast(manager)
@@ -1,8 +1,12 @@
-from sqlalchemy import create_engine, text as sql_text
+from sqlalchemy import create_engine, func, inspect, make_url, select, text as sql_text, tuple_
+from sqlalchemy.exc import DatabaseError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import Session, sessionmaker
 import os
+from datetime import datetime, timedelta
 from dotenv import load_dotenv
-from models import InvestorBehavior, PredictionLog, Stock
+from models import OHLC_MODELS, AgentScoreboard, Base, InvestorBehavior, PredictionLog, Stock
+from price_cache import price_cache
 
 load_dotenv()
 # Replace with your actual MySQL credentials from your PHP configuration
@@ -20,6 +24,52 @@ engine = create_engine(
 )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async twin of the engine for the FastAPI routers, so queries don't block the event loop
+ASYNC_DRIVERS = {"mysql": "mysql+aiomysql", "sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DB_URL")
+if not ASYNC_DATABASE_URL:
+    sync_url = make_url(SQLALCHEMY_DATABASE_URL)
+    ASYNC_DATABASE_URL = sync_url.set(drivername=ASYNC_DRIVERS.get(sync_url.get_backend_name(), sync_url.drivername))
+
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    pool_size=10,
+    max_overflow=20,
+    pool_pre_ping=True
+)
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+# Tables added after the first deployment; created when missing
+SCHEMA_TABLES = [model.__table__ for model in OHLC_MODELS.values()] + [AgentScoreboard.__table__]
+# Columns added to tables that already existed; create_all only creates missing tables
+SCHEMA_PATCHES = [
+    ("prediction_logs", "horizon_minutes", "ALTER TABLE prediction_logs ADD COLUMN horizon_minutes INT NOT NULL DEFAULT 60"),
+]
+
+def _apply_schema_patches():
+    Base.metadata.create_all(engine, tables=SCHEMA_TABLES) # checkfirst: existing tables are left alone
+    inspector = inspect(engine)
+    applied = 0
+    with engine.begin() as conn:
+        for table, column, ddl in SCHEMA_PATCHES:
+            if inspector.has_table(table) and column not in {c["name"] for c in inspector.get_columns(table)}:
+                conn.execute(sql_text(ddl))
+                print(f"🛠️ Schema: added {table}.{column}.")
+                applied += 1
+    return applied
+
+def db_apply_schema_patches():
+    """
+    Creates the SCHEMA_TABLES and runs the SCHEMA_PATCHES the live database is missing.
+    Safe to repeat; a worker that loses a race with another one's DDL checks again once.
+    """
+    try:
+        return _apply_schema_patches()
+    except DatabaseError as e:
+        print(f"⚠️ Schema: {type(e).__name__} while patching, re-checking ({e.orig}).")
+        return _apply_schema_patches()
+
 # Dependency to get a DB session across all routers
 def get_db():
     db = SessionLocal()
@@ -28,8 +78,36 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def _recent_prices_stmt(symbol: str, limit: int):
+    return select(Stock).where(Stock.symbol == symbol).order_by(Stock.datetime.desc()).limit(limit)
+
 def get_recent_prices(symbol: str, db: Session, limit: int = 10):
-    return db.query(Stock).filter(Stock.symbol == symbol).order_by(Stock.datetime.desc()).limit(limit).all()
+    # Served from the in-process ring buffer; MySQL is only hit for symbols it can't answer yet
+    cached = price_cache.recent(symbol, limit)
+    if cached is not None:
+        return cached
+    if not price_cache.wants_seed(symbol):
+        return db.execute(_recent_prices_stmt(symbol, limit)).scalars().all()
+    # A ring created at runtime: fill it from the DB once so later reads stay in memory
+    rows = db.execute(_recent_prices_stmt(symbol, max(limit, price_cache.capacity))).scalars().all()
+    price_cache.seed(symbol, rows)
+    return rows[:limit]
+
+async def get_recent_prices_async(symbol: str, db: AsyncSession, limit: int = 10):
+    cached = price_cache.recent(symbol, limit)
+    if cached is not None:
+        return cached
+    if not price_cache.wants_seed(symbol):
+        result = await db.execute(_recent_prices_stmt(symbol, limit))
+        return result.scalars().all()
+    result = await db.execute(_recent_prices_stmt(symbol, max(limit, price_cache.capacity)))
+    rows = result.scalars().all()
+    price_cache.seed(symbol, rows)
+    return rows[:limit]
 
 def db_save_price(symbol: str, price: float, dt: str, db: Session):
     """Unified database saver with conflict resolution."""
@@ -38,7 +116,9 @@ def db_save_price(symbol: str, price: float, dt: str, db: Session):
         VALUES (:s, :p, :dt)
         ON DUPLICATE KEY UPDATE price = VALUES(price)
     """)
+    stored = _stored_ticks([(symbol, price, dt)], db)
     db.execute(query, {"s": symbol, "p": price, "dt": dt})
+    db_update_rollups([(symbol, price, dt)], db, stored)
     db.commit()
 
 def db_save_behavior(data: InvestorBehavior, db: Session):
@@ -51,13 +131,188 @@ def db_save_behavior(data: InvestorBehavior, db: Session):
     db.execute(query, {"s": data['symbol'], "ft": data['flow_type'], "v": data['volume'], "ts": data['timestamp']})
     db.commit()
 
-def save_prediction_to_db(symbol: str, sentiment: str, confidence: float, price: float, db: Session):
+BULK_CHUNK_SIZE = 500  # Rows per statement, keeps each INSERT well under max_allowed_packet
+
+def _multi_row_upsert(table: str, columns: list, rows: list, on_duplicate: str):
+    """Builds one INSERT ... VALUES (...), (...) ON DUPLICATE KEY statement for `rows`."""
+    placeholders = []
+    params = {}
+    for i, row in enumerate(rows):
+        placeholders.append("(" + ", ".join(f":{col}_{i}" for col in columns) + ")")
+        params.update({f"{col}_{i}": value for col, value in zip(columns, row)})
+
+    query = sql_text(
+        f"INSERT INTO {table} ({', '.join(columns)}) VALUES {', '.join(placeholders)} "
+        f"ON DUPLICATE KEY UPDATE {on_duplicate}"
+    )
+    return query, params
+
+# How each rollup truncates a tick time down to the start of its candle
+ROLLUP_TRUNCATE = {
+    "1m": {"second": 0, "microsecond": 0},
+    "1h": {"minute": 0, "second": 0, "microsecond": 0},
+    "1d": {"hour": 0, "minute": 0, "second": 0, "microsecond": 0},
+}
+
+# DATE_FORMAT patterns for the same truncation, used when rebuilding candles in SQL
+ROLLUP_BUCKET_FORMAT = {"1m": "%Y-%m-%d %H:%i:00", "1h": "%Y-%m-%d %H:00:00", "1d": "%Y-%m-%d 00:00:00"}
+ROLLUP_STEP = {"1m": timedelta(minutes=1), "1h": timedelta(hours=1), "1d": timedelta(days=1)}
+
+# MySQL applies these left to right, so open/close are compared before open_at/close_at move
+ROLLUP_ON_DUPLICATE = """
+    high = GREATEST(high, VALUES(high)),
+    low = LEAST(low, VALUES(low)),
+    open = IF(VALUES(open_at) < open_at, VALUES(open), open),
+    open_at = LEAST(open_at, VALUES(open_at)),
+    close = IF(VALUES(close_at) >= close_at, VALUES(close), close),
+    close_at = GREATEST(close_at, VALUES(close_at)),
+    ticks = ticks + VALUES(ticks)
+"""
+
+def _as_datetime(dt):
+    return datetime.fromisoformat(dt) if isinstance(dt, str) else dt
+
+def _stored_ticks(ticks: list, db: Session):
+    """(symbol, datetime) keys among `ticks` that `stocks` already holds; run it before the ticks are written."""
+    keys = list({(symbol, _as_datetime(dt)) for symbol, _, dt in ticks})
+    stored = set()
+    for i in range(0, len(keys), BULK_CHUNK_SIZE):
+        rows = db.execute(
+            select(Stock.symbol, Stock.datetime).where(tuple_(Stock.symbol, Stock.datetime).in_(keys[i:i + BULK_CHUNK_SIZE]))
+        ).all()
+        stored.update((symbol, dt) for symbol, dt in rows)
+    return stored
+
+def _fold_ticks(ticks: list, resolution: str, stored: set = frozenset()):
+    """
+    Folds (symbol, price, datetime) ticks into one candle row per (symbol, bucket).
+    Ticks already in `stored` (or repeated within the batch) still move the prices but
+    are not counted again, so re-saving a tick leaves the candle's tick count alone.
+    """
+    truncate = ROLLUP_TRUNCATE[resolution]
+    candles = {}
+    counted = set(stored)
+    for symbol, price, dt in ticks:
+        dt = _as_datetime(dt)
+        is_new = (symbol, dt) not in counted
+        counted.add((symbol, dt))
+        key = (symbol, dt.replace(**truncate))
+        c = candles.get(key)
+        if c is None:
+            candles[key] = {"open": price, "high": price, "low": price, "close": price, "ticks": int(is_new), "open_at": dt, "close_at": dt}
+            continue
+        c["high"] = max(c["high"], price)
+        c["low"] = min(c["low"], price)
+        c["ticks"] += is_new
+        if dt < c["open_at"]:
+            c["open"], c["open_at"] = price, dt
+        if dt >= c["close_at"]:
+            c["close"], c["close_at"] = price, dt
+
+    return [(symbol, bucket, c["open"], c["high"], c["low"], c["close"], c["ticks"], c["open_at"], c["close_at"])
+            for (symbol, bucket), c in candles.items()]
+
+def db_update_rollups(ticks: list, db: Session, stored: set = frozenset()):
+    """
+    Incrementally folds raw ticks into the 1m/1h/1d OHLC tables. `stored` holds the
+    _stored_ticks keys taken before the ticks were saved. Runs inside the caller's
+    transaction; the caller commits.
+    """
+    columns = ["symbol", "bucket", "open", "high", "low", "close", "ticks", "open_at", "close_at"]
+    for resolution, model in OHLC_MODELS.items():
+        rows = _fold_ticks(ticks, resolution, stored)
+        for i in range(0, len(rows), BULK_CHUNK_SIZE):
+            query, params = _multi_row_upsert(model.__tablename__, columns, rows[i:i + BULK_CHUNK_SIZE], ROLLUP_ON_DUPLICATE)
+            db.execute(query, params)
+
+# Rebuilds candles from `stocks` with absolute values; {cutoff} optionally bounds the history
+ROLLUP_BACKFILL = """
+    INSERT INTO {table} (symbol, bucket, open, high, low, close, ticks, open_at, close_at)
+    SELECT symbol, bucket, MIN(first_price), MAX(price), MIN(price), MIN(last_price), COUNT(*), MIN(datetime), MAX(datetime)
+    FROM (
+        SELECT symbol, price, datetime, DATE_FORMAT(datetime, '{bucket}') AS bucket,
+               FIRST_VALUE(price) OVER candle AS first_price,
+               LAST_VALUE(price) OVER candle AS last_price
+        FROM stocks
+        WHERE symbol = :symbol {cutoff}
+        WINDOW candle AS (
+            PARTITION BY DATE_FORMAT(datetime, '{bucket}') ORDER BY datetime
+            ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING
+        )
+    ) AS ordered
+    GROUP BY symbol, bucket
+    ON DUPLICATE KEY UPDATE
+        open = VALUES(open), high = VALUES(high), low = VALUES(low), close = VALUES(close),
+        ticks = VALUES(ticks), open_at = VALUES(open_at), close_at = VALUES(close_at)
+"""
+
+def db_backfill_rollups(db: Session):
+    """
+    One-shot fill of the 1m/1h/1d tables from the `stocks` history that predates them.
+    Per symbol and resolution, every candle up to and including the first one the ingest
+    path wrote is recomputed from the raw rows, so a rerun only redoes that boundary candle.
+    Commits per symbol and resolution; returns the number of rows MySQL reports touched.
+    """
+    symbols = db.execute(select(Stock.symbol).distinct()).scalars().all()
+    written = 0
+    for resolution, model in OHLC_MODELS.items():
+        for symbol in symbols:
+            first_bucket = db.execute(select(func.min(model.bucket)).where(model.symbol == symbol)).scalar()
+            params = {"symbol": symbol}
+            cutoff = ""
+            if first_bucket is not None:
+                params["cutoff"] = first_bucket + ROLLUP_STEP[resolution]
+                cutoff = "AND datetime < :cutoff"
+
+            query = ROLLUP_BACKFILL.format(table=model.__tablename__, bucket=ROLLUP_BUCKET_FORMAT[resolution], cutoff=cutoff)
+            try:
+                written += db.execute(sql_text(query), params).rowcount
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+    return written
+
+def db_save_cycle(ticks: list, behaviors: list, db: Session):
+    """
+    Bulk writer for one sync cycle. `ticks` are (symbol, price, datetime) tuples and
+    `behaviors` are map_to_investor_behavior dicts; both go out as multi-row upserts
+    inside a single transaction. Returns (price_rows, behavior_rows) written.
+    """
+    behavior_rows = [(b['symbol'], b['flow_type'], b['volume'], b['timestamp']) for b in behaviors]
+
+    try:
+        stored = _stored_ticks(ticks, db)
+        for i in range(0, len(ticks), BULK_CHUNK_SIZE):
+            query, params = _multi_row_upsert(
+                "stocks", ["symbol", "price", "datetime"], ticks[i:i + BULK_CHUNK_SIZE],
+                "price = VALUES(price)"
+            )
+            db.execute(query, params)
+        db_update_rollups(ticks, db, stored)
+
+        for i in range(0, len(behavior_rows), BULK_CHUNK_SIZE):
+            query, params = _multi_row_upsert(
+                "investor_behavior", ["symbol", "flow_type", "volume", "timestamp"], behavior_rows[i:i + BULK_CHUNK_SIZE],
+                "volume = VALUES(volume)"
+            )
+            db.execute(query, params)
+
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    return len(ticks), len(behavior_rows)
+
+def save_prediction_to_db(symbol: str, sentiment: str, confidence: float, price: float, db: Session, horizon_minutes: int = 60):
     """Persists Lucy's analytical thoughts for the Judge to evaluate later."""
     new_prediction = PredictionLog(
         symbol=symbol.upper(),
         predicted_sentiment=sentiment, # "BULLISH" or "BEARISH"
         confidence=confidence,           # e.g., 0.85
         price_at_prediction=price,
+        horizon_minutes=horizon_minutes, # The Judge grades against the price this many minutes later
         was_evaluated=False,
         was_correct=None # Explicitly Null until evaluated
     )
@@ -0,0 +1,55 @@
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent
+path_to_lucy_parent = str(Path(__file__).resolve().parent.parent.parent)
+
+# Add that directory to the Python path
+if path_to_lucy_parent not in sys.path:
+    sys.path.append(path_to_lucy_parent)
+
+from lucy import text
+
+# Featurization cost per message on the usenet questions corpus, with and without the stem memo.
+# Not a test: run it by hand (python benchstem.py) when touching lucy/text.py.
+
+def stem_all(wordlists):
+    started = time.perf_counter()
+    for words in wordlists:
+        for word in words:
+            text.stem(word)
+    return time.perf_counter() - started
+
+def featurize(stringlist, vocab, vocabidf):
+    started = time.perf_counter()
+    text.genfeaturesFromList(stringlist, vocab, vocabidf)
+    return time.perf_counter() - started
+
+stringlist = []
+for name in ("data_questions.txt", "data_questions2.txt", "data_questions3.txt"):
+    stringlist += text.readLabelledTextLines(BASE_DIR / "data" / name)[0]
+
+vocab, vocabf, vocabidf = text.readvocab(BASE_DIR / "models/data_questions_vocab.txt")
+print(f"Corpus: {len(stringlist)} messages, vocabulary of {len(vocab)} terms.")
+wordlists = [text.cleantext(message).split() for message in stringlist]
+
+# Before: every word goes through the Porter regexes
+cached_stem = text.stem
+text.stem = text._porter_stem
+stem_before = stem_all(wordlists)
+before = featurize(stringlist, vocab, vocabidf)
+text.stem = cached_stem
+
+# After: a cold pass fills the memo, a warm pass is what a long-running server sees
+text.stem.cache_clear()
+cold = featurize(stringlist, vocab, vocabidf)
+warm = featurize(stringlist, vocab, vocabidf)
+stem_warm = stem_all(wordlists)
+
+n = len(stringlist)
+print(f"Stemming only : {stem_before / n * 1e6:8.1f} -> {stem_warm / n * 1e6:6.1f} us/message ({stem_before / stem_warm:.1f}x)")
+print(f"Uncached stem : {before / n * 1e6:8.1f} us/message featurized")
+print(f"Cached (cold) : {cold / n * 1e6:8.1f} us/message featurized")
+print(f"Cached (warm) : {warm / n * 1e6:8.1f} us/message featurized ({before / warm:.2f}x)")
+print(f"Stem cache    : {text.stem_cache_info()}")
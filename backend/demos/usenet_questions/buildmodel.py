@@ -3,6 +3,7 @@ import joblib
 from sklearn import svm
 from sklearn.pipeline import Pipeline
 from sklearn.preprocessing import Normalizer
+from scipy.sparse import csr_matrix
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent
@@ -15,7 +16,8 @@ data = pd.read_csv(MODEL_PATH)
 
 # Assume first column is label, rest are feature vectors
 y = data.iloc[:, 0].values
-X = data.iloc[:, 1:].values
+# Trained on sparse rows so brain.py can feed lucy.text.Vocabulary output straight in
+X = csr_matrix(data.iloc[:, 1:].values.astype(float))
 
 print(f"Dataset loaded: {X.shape[0]} samples with {X.shape[1]} features.")
 
@@ -42,6 +44,7 @@ pipe.fit(X, y)
 model_metadata = {
     'pipeline': pipe,
     'feature_count': X.shape[1],
+    'sparse_input': True,  # Fitted on CSR rows; lucy.text.toPipelineInput passes Vocabulary output as-is
     'model_version': '1.0'
 }
 
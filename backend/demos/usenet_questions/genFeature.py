@@ -16,5 +16,5 @@ vocabidf = r[2]
 text.saveVocab("data_questions_vocab.txt", vocab, vocabf, vocabidf)
 
 # generate features
-features = text.genfeaturesFromList(stringlist, vocab, vocabidf)  # list of dictionaries
+features = text.Vocabulary(vocab, vocabidf).transform(stringlist).toarray()  # sparse rows, densified for the CSV
 text.saveFeatures("data_questions_feature.csv", vocab, features, y)
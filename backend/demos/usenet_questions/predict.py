@@ -20,15 +20,14 @@ bundle = joblib.load(BASE_DIR / "models/data_questions_pipeline.joblib")
 model = bundle['pipeline']
 
 # Load vocab to process the string
-r = text.readvocab(BASE_DIR / "models/data_questions_vocab.txt")
-vocab, vocabidf = r[0], r[2]
+vocabulary = text.Vocabulary.fromFile(BASE_DIR / "models/data_questions_vocab.txt")
 
 # Prediction logic
 sentence = "Is DES available in hardware?"
-fv = text.genfeatureVectorFromString(sentence, vocab, vocabidf)
+fv = text.toPipelineInput(vocabulary.featureVector(sentence), bundle)
 
 # The pipeline handles the normalization and the SVC logic automatically
-pred = model.predict([fv])
-prob = model.predict_proba([fv])
+pred = model.predict(fv)
+prob = model.predict_proba(fv)
 
 print(f"Result: {pred[0]} | Confidence: {max(prob[0]):.2f}")
\ No newline at end of file
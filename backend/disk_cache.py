@@ -0,0 +1,136 @@
+import asyncio
+import json
+import os
+import re
+import tempfile
+import time
+import httpx
+from http_pool import http_pool
+
+LUCY_CACHE_DIR = os.getenv("LUCY_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache"))
+
+_download_locks: dict[str, asyncio.Lock] = {}
+
+class CorruptCacheFile(ValueError):
+    """A mirrored file that can't be parsed (truncated write, disk full); `path` should be discarded."""
+    def __init__(self, path: str, reason: str):
+        super().__init__(f"{path} {reason}")
+        self.path = path
+
+def _read_meta(meta_path: str):
+    try:
+        with open(meta_path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _write_meta(meta_path: str, meta: dict):
+    fd, partial = tempfile.mkstemp(dir=os.path.dirname(meta_path), suffix=".part")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(partial, meta_path)
+
+async def cached_download(url: str, name: str, max_age: float, timeout: float = 60.0):
+    """
+    Mirrors `url` into LUCY_CACHE_DIR/name. Within `max_age` seconds of the last check the file
+    is used as-is; after that it is revalidated with If-None-Match / If-Modified-Since and only
+    re-downloaded when upstream changed. Bodies are streamed to disk, never held in memory.
+    Returns the local path, or None when nothing is cached and upstream failed.
+    """
+    os.makedirs(LUCY_CACHE_DIR, exist_ok=True)
+    path = os.path.join(LUCY_CACHE_DIR, name)
+    meta_path = path + ".meta.json"
+
+    async with _download_locks.setdefault(name, asyncio.Lock()):
+        meta = _read_meta(meta_path) if os.path.exists(path) else {}
+        if meta and (time.time() - meta.get("checked_at", 0)) < max_age:
+            return path
+
+        headers = {}
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+        try:
+            async with http_pool.stream("GET", url, headers=headers, timeout=timeout) as response:
+                if response.status_code == 304:
+                    meta["checked_at"] = time.time()
+                    _write_meta(meta_path, meta)
+                    return path
+
+                if response.status_code != 200:
+                    print(f"⚠️ Cache: {name} answered {response.status_code}, {'serving the cached copy' if meta else 'nothing cached'}.")
+                    return path if meta else None
+
+                # A private temp file per download: other workers may be fetching the same list
+                fd, partial = tempfile.mkstemp(dir=LUCY_CACHE_DIR, prefix=f".{name}.", suffix=".part")
+                try:
+                    with os.fdopen(fd, "wb") as f:
+                        async for chunk in response.aiter_bytes():
+                            f.write(chunk)
+                    os.replace(partial, path) # Readers never see a half-written file
+                except BaseException:
+                    os.unlink(partial)
+                    raise
+
+                _write_meta(meta_path, {
+                    "url": url,
+                    "etag": response.headers.get("etag"),
+                    "last_modified": response.headers.get("last-modified"),
+                    "checked_at": time.time()
+                })
+                print(f"📥 Cache: refreshed {name} ({os.path.getsize(path) / 1e6:.1f} MB).")
+                return path
+        except httpx.HTTPError as e:
+            print(f"⚠️ Cache: could not revalidate {name} ({type(e).__name__}), {'serving the cached copy' if meta else 'nothing cached'}.")
+            return path if meta else None
+
+def discard(path: str):
+    """Forgets a mirrored file and its metadata, so the next cached_download fetches it afresh."""
+    for stale in (path, path + ".meta.json"):
+        try:
+            os.unlink(stale)
+        except FileNotFoundError:
+            pass
+
+def load_json(path: str):
+    with open(path, encoding="utf-8") as f:
+        try:
+            return json.load(f)
+        except ValueError:
+            raise CorruptCacheFile(path, "is not valid JSON")
+
+_ARRAY_SEPARATORS = re.compile(r"[\s,]*")
+
+def iter_json_array(path: str, chunk_size: int = 1 << 16):
+    """
+    Yields the elements of a file holding one top-level JSON array of objects, decoding
+    them one at a time so at most about one chunk of the file is in memory.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, encoding="utf-8") as f:
+        buf = f.read(chunk_size)
+        pos = _ARRAY_SEPARATORS.match(buf).end()
+        if not buf.startswith("[", pos):
+            raise CorruptCacheFile(path, "does not hold a JSON array")
+        pos += 1
+
+        while True:
+            pos = _ARRAY_SEPARATORS.match(buf, pos).end()
+            if pos < len(buf):
+                if buf[pos] == "]":
+                    return
+                try:
+                    item, end = decoder.raw_decode(buf, pos)
+                except json.JSONDecodeError:
+                    end = None # Element runs past the buffer
+                if end is not None:
+                    pos = end
+                    yield item
+                    continue
+
+            more = f.read(chunk_size)
+            if not more:
+                raise CorruptCacheFile(path, "ends inside its JSON array")
+            buf, pos = buf[pos:] + more, 0
@@ -0,0 +1,80 @@
+import importlib.util
+import os
+from urllib.parse import urlsplit
+import httpx
+
+HTTP_TIMEOUT = float(os.getenv("LUCY_HTTP_TIMEOUT", 10.0))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("LUCY_HTTP_CONNECT_TIMEOUT", 5.0))
+HTTP_MAX_PER_HOST = int(os.getenv("LUCY_HTTP_MAX_PER_HOST", 10))
+HTTP_KEEPALIVE_SECONDS = float(os.getenv("LUCY_HTTP_KEEPALIVE_SECONDS", 60.0))
+# "auto" turns HTTP/2 on when the optional h2 package is installed
+HTTP2_MODE = os.getenv("LUCY_HTTP2", "auto")
+
+# Upstreams that deserve a different connection budget than HTTP_MAX_PER_HOST
+HOST_LIMITS = {
+    "hermes.pyth.network": 20,   # Batched price polls plus the SSE stream
+    "api.dexscreener.com": 4,    # 300 req/min; fetch_dex_whales already gates to 2 in flight
+    "api.coingecko.com": 2,      # Free tier, a couple of list/market calls per refresh
+    "api.alternative.me": 2,
+}
+
+def _http2_enabled():
+    available = importlib.util.find_spec("h2") is not None
+    if HTTP2_MODE == "auto":
+        return available
+    if HTTP2_MODE in ("1", "true", "on") and not available:
+        print("⚠️ HTTP pool: LUCY_HTTP2 is on but h2 is not installed, staying on HTTP/1.1.")
+        return False
+    return HTTP2_MODE in ("1", "true", "on")
+
+class HttpPool:
+    """
+    Keep-alive connection pools shared by every upstream call, one httpx.AsyncClient per host
+    so each upstream gets its own connection limit. Opened and closed by the FastAPI lifespan;
+    a client is also created on first use for scripts that never run the lifespan.
+    """
+    def __init__(self, timeout: float = HTTP_TIMEOUT, connect_timeout: float = HTTP_CONNECT_TIMEOUT,
+                 max_per_host: int = HTTP_MAX_PER_HOST, keepalive_seconds: float = HTTP_KEEPALIVE_SECONDS,
+                 host_limits: dict = None):
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.max_per_host = max_per_host
+        self.keepalive_seconds = keepalive_seconds
+        self.host_limits = HOST_LIMITS if host_limits is None else host_limits
+        self.http2 = False
+        self.clients: dict[str, httpx.AsyncClient] = {}
+
+    async def start(self):
+        self.http2 = _http2_enabled()
+        print(f"🌐 HTTP pool ready ({'HTTP/2' if self.http2 else 'HTTP/1.1'}, {self.max_per_host} connections per host).")
+
+    async def close(self):
+        clients, self.clients = self.clients, {}
+        for client in clients.values():
+            await client.aclose()
+
+    def client(self, url: str):
+        """The pooled client for `url`'s scheme and host."""
+        parts = urlsplit(url)
+        key = f"{parts.scheme}://{parts.netloc}"
+        client = self.clients.get(key)
+        if client is None or client.is_closed:
+            limit = self.host_limits.get(parts.hostname, self.max_per_host)
+            client = httpx.AsyncClient(
+                timeout=self.timeout,
+                http2=self.http2,
+                limits=httpx.Limits(
+                    max_connections=limit,
+                    max_keepalive_connections=limit,
+                    keepalive_expiry=self.keepalive_seconds
+                )
+            )
+            self.clients[key] = client
+        return client
+
+    async def get(self, url: str, **kwargs):
+        return await self.client(url).get(url, **kwargs)
+
+    def stream(self, method: str, url: str, **kwargs):
+        return self.client(url).stream(method, url, **kwargs)
+
+http_pool = HttpPool()
@@ -1,7 +1,11 @@
 import re
 import operator
+import os
 import urllib
 import math
+from functools import lru_cache
+import numpy as np
+from scipy.sparse import csr_matrix
 
 _step2list = {
               "ational": "ate",
@@ -66,7 +70,10 @@ _step5 = re.compile("^(.+?)e$")
 
 # Stemming function
 
-def stem(w):
+# Distinct words kept by the stem memo; corpus vocabularies stay well under this
+STEM_CACHE_SIZE = int(os.getenv("LUCY_STEM_CACHE_SIZE", 65536))
+
+def _porter_stem(w):
     """Uses the Porter stemming algorithm to remove suffixes from English
     words.
 
@@ -163,6 +170,22 @@ def stem(w):
 
     return w
 
+# Memoized: the vocabulary builder and the feature generators share one bounded cache,
+# so each distinct word runs through the regexes once per process
+stem = lru_cache(maxsize=STEM_CACHE_SIZE)(_porter_stem)
+
+def stem_cache_info():
+    """Hit-rate stats for the shared stem cache."""
+    info = stem.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        "hits": info.hits,
+        "misses": info.misses,
+        "size": info.currsize,
+        "maxsize": info.maxsize,
+        "hit_rate": round(info.hits / lookups, 4) if lookups else 0.0
+    }
+
 def cleantext(string):
     string = re.sub('[^a-zA-Z]', ' ', string)
 
@@ -214,7 +237,7 @@ def genvocabFromStringList(stringlist, dfthreshould = 3, stopword = []):
                 vocab[word] = 1
 
         # increment df
-        for k,v in ddf.iteritems():
+        for k,v in ddf.items():
             if k in vocab_df:
                 vocab_df[k] += 1
             else:
@@ -322,6 +345,57 @@ def genfeatureVectorFromString(text, vocab, vocabidf):
         fv.append(v)
     return fv # list
 
+class Vocabulary:
+    """Term -> column hash with precomputed log10 idf weights. Turns text into scipy CSR rows
+    holding the same tf x log(N/(1+d)) values as genfeatureVectorFromString, in O(words)."""
+
+    def __init__(self, vocab, vocabidf):
+        self.terms = list(vocab)
+        self.index = {term: i for i, term in enumerate(self.terms)}
+        self.weights = np.log10(np.asarray(vocabidf, dtype=float))
+
+    @classmethod
+    def fromFile(cls, vocabFileName):
+        r = readvocab(vocabFileName)
+        return cls(r[0], r[2])
+
+    def __len__(self):
+        return len(self.terms)
+
+    def termCounts(self, text):
+        # Same cleaning and segmenting as genfeatureVectorFromString, so trained models see identical features
+        counts = dict()
+        for word in re.split(' |,', cleantext(text)):
+            i = self.index.get(stem(word))
+            if i is not None:
+                counts[i] = counts.get(i, 0) + 1
+        return counts
+
+    def transform(self, stringlist):
+        """One CSR row per string, shape (len(stringlist), len(vocab))."""
+        indptr = [0]
+        indices = []
+        data = []
+        for text in stringlist:
+            counts = self.termCounts(text)
+            indices.extend(counts.keys())
+            data.extend(counts.values())
+            indptr.append(len(indices))
+
+        X = csr_matrix((np.asarray(data, dtype=float), np.asarray(indices, dtype=np.int32), indptr),
+                       shape=(len(stringlist), len(self.terms)))
+        X.data *= self.weights[X.indices]
+        X.sort_indices()
+        return X
+
+    def featureVector(self, text):
+        return self.transform([text])
+
+def toPipelineInput(X, bundle):
+    """An SVC fitted on dense arrays refuses sparse rows. Bundles saved by buildmodel.py say
+    which input their pipeline was fitted on; older bundles were fitted dense."""
+    return X if bundle.get('sparse_input', False) else X.toarray()
+
 def genfeaturesFromList(stringlist, vocab, vocabidf):
     features = []
     for text in stringlist:
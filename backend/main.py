@@ -1,72 +1,120 @@
-import json
+import asyncio
 import os
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from datetime import datetime
+from fastapi import FastAPI, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
 from routers import market, agent
 from contextlib import asynccontextmanager
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from tasks import continuous_oracle_sync, evaluate_predictions_task
+from stream import HermesStreamEngine
+from database import SessionLocal, db_apply_schema_patches, db_backfill_rollups
+from price_cache import price_cache, ticker_board
+from scoreboard import scoreboard
+from ws_manager import ConnectionManager
+from broadcast_bus import create_broadcast_backend
+from http_pool import http_pool
+from market_context import MARKET_CONTEXT
+from symbol_matcher import symbol_matcher
+from token_catalog import token_catalog
 from dotenv import load_dotenv
 from mangum import Mangum
 
 load_dotenv()
 # --- 1. WebSocket Manager for the Thought Stream ---
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: list[WebSocket] = []
-
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
-
-    def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
-
-    async def broadcast(self, message: str):
-        # Sending a structured JSON "thought"
-        payload = json.dumps({"type": "thought", "content": message})
-        for connection in self.active_connections:
-            try:
-                await connection.send_text(payload)
-            except:
-                pass # Handle stale connections safely
-
 manager = ConnectionManager()
+# Sync tasks emit through the bus; under several workers it relays every event to each worker's manager
+bus = create_broadcast_backend(manager)
+
+def backfill_rollups():
+    """Candles for the `stocks` history older than the rollup tables; cheap once it has run."""
+    with SessionLocal() as db:
+        written = db_backfill_rollups(db)
+    print(f"🕯️ [LUCY] Rollup backfill done ({written} candle rows touched).")
+
+def backfill_scoreboard():
+    with SessionLocal() as db:
+        scoreboard.backfill(db)
 
 # --- 2. Lifespan with Heartbeat ---
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     scheduler = AsyncIOScheduler()
+    stream_engine = None
 
     print("🚀 [LUCY] Starting Autonomous Brain Loops...")
-
-    # Start autonomous loops
-    scheduler.add_job(
-        continuous_oracle_sync, 
-        'interval', 
-        seconds=30, 
-        id='oracle_sync', 
-        args=[manager], 
-        max_instances=3, # 🛡️ Prevents overlapping runs
-        coalesce=True    # 🛡️ Skips missed runs if the server was down
-    )
-    scheduler.add_job(
-        evaluate_predictions_task, 
-        'interval', 
-        minutes=5, 
-        id='evaluate_predictions', 
-        args=[manager],
-        max_instances=3, # 🛡️ Prevents overlapping runs
-        coalesce=True    # 🛡️ Skips missed runs if the server was down
-    )
-    scheduler.start()
-
-    print("✅ [LUCY] Scheduler started successfully.")
+    await http_pool.start()
+
+    # Tables and columns the warm-up below reads; every worker checks them, so none boots against an old schema
+    await asyncio.to_thread(db_apply_schema_patches)
+
+    # Hot read paths (chat, analysis, tickers) are served from memory from here on.
+    # Every worker runs this, so it only reads; anything else that writes belongs in start_loops.
+    with SessionLocal() as db:
+        price_cache.warm(db)
+        scoreboard.warm(db)
+        symbol_matcher.warm(db)
+    ticker_board.refresh(price_cache.tickers())
+    # Every worker keeps its own catalogue and chat matcher current, so symbol extraction agrees across workers
+    catalog_task = asyncio.create_task(token_catalog.keep_fresh())
+
+    # Start autonomous loops and one-off writes, in the leading worker only
+    async def start_loops():
+        nonlocal stream_engine
+        await asyncio.to_thread(backfill_scoreboard)
+        await asyncio.to_thread(backfill_rollups) # Before ingestion, so the first candles aren't racing it
+        # LUCY_INGEST_MODE=stream swaps the 30s polling job for a live Hermes connection
+        if os.getenv("LUCY_INGEST_MODE", "poll") == "stream":
+            stream_engine = HermesStreamEngine(
+                bus,
+                flush_interval=float(os.getenv("LUCY_STREAM_FLUSH_SECONDS", 0.5)),
+                db_interval=float(os.getenv("LUCY_STREAM_DB_SECONDS", 30))
+            )
+            await stream_engine.start()
+        else:
+            scheduler.add_job(
+                continuous_oracle_sync, 
+                'interval', 
+                seconds=30, 
+                id='oracle_sync', 
+                args=[bus], 
+                max_instances=3, # 🛡️ Prevents overlapping runs
+                coalesce=True    # 🛡️ Skips missed runs if the server was down
+            )
+        scheduler.add_job(
+            evaluate_predictions_task, 
+            'interval', 
+            minutes=5, 
+            id='evaluate_predictions', 
+            args=[bus],
+            max_instances=3, # 🛡️ Prevents overlapping runs
+            coalesce=True    # 🛡️ Skips missed runs if the server was down
+        )
+        for cached in MARKET_CONTEXT:
+            scheduler.add_job(
+                cached.refresh,
+                'interval',
+                seconds=cached.ttl, # Fear & greed moves daily, movers every few minutes
+                id=f'market_context:{cached.name}',
+                next_run_time=datetime.now(), # Prime the cache so the first briefing doesn't wait
+                max_instances=1,
+                coalesce=True
+            )
+        scheduler.start()
+        print("✅ [LUCY] Scheduler started successfully.")
+
+    await bus.start(start_loops)
 
     yield
     
     print("🛑 [LUCY] Shutting down scheduler...")
-    scheduler.shutdown()
+    if scheduler.running:
+        scheduler.shutdown()
+    if stream_engine:
+        await stream_engine.stop()
+    catalog_task.cancel()
+    await bus.stop()
+    await http_pool.close()
 
 app = FastAPI(title="Lucy Agent Web3", lifespan=lifespan)
 
@@ -85,14 +133,24 @@ app.include_router(agent.router)
 # --- 4. The Live WebSocket Log Endpoint ---
 @app.websocket("/ws/thoughts")
 async def websocket_endpoint(websocket: WebSocket):
-    await manager.connect(websocket)
+    # ?protocol=msgpack opts into binary frames up front; a "hello" message can switch later
+    await manager.connect(websocket, websocket.query_params.get("protocol", "json"))
     try:
         while True:
-            # Just keep the connection open
-            await websocket.receive_text() 
-    except WebSocketDisconnect:
+            # Keeps the connection open and applies subscribe/unsubscribe requests, text or binary
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            data = message.get("text") if message.get("text") is not None else message.get("bytes")
+            if data is not None:
+                manager.handle_message(websocket, data)
+    finally:
         manager.disconnect(websocket)
 
+@app.get("/ws/stats")
+async def websocket_stats():
+    return {**manager.stats(), "worker": os.getpid(), "leader": bus.is_leader}
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("main:app", host="0.0.0.0", port=int(os.getenv("PORT", 8000)), reload=True)
@@ -0,0 +1,61 @@
+import asyncio
+import os
+import time
+from utils import fetch_fear_and_greed, fetch_global_movers
+
+SENTIMENT_TTL = float(os.getenv("LUCY_SENTIMENT_TTL_SECONDS", 600))  # alternative.me updates once a day
+MOVERS_TTL = float(os.getenv("LUCY_MOVERS_TTL_SECONDS", 300))
+RETRY_SECONDS = 30.0 # After a failed fetch, keep serving the old value this long before trying again
+
+class CachedFetch:
+    """
+    Stale-while-revalidate cache around one async fetcher. Readers get the last good value
+    straight from memory; once it is older than `ttl` a single background refresh is started
+    and readers keep the stale value until it lands. Only the very first read waits on upstream,
+    and after a failed cold fetch readers get `fallback` for RETRY_SECONDS instead of retrying.
+    """
+    def __init__(self, name: str, fetch, ttl: float, fallback: dict):
+        self.name = name
+        self.fetch = fetch
+        self.ttl = ttl
+        self.fallback = fallback
+        self.value = None
+        self.fetched_at = 0.0
+        self.failed_at = 0.0
+        self._inflight: asyncio.Task = None
+
+    async def get(self):
+        if self.value is None:
+            if (time.monotonic() - self.failed_at) > RETRY_SECONDS:
+                await self.refresh() # Cold: nothing to serve yet
+        elif self._is_stale():
+            self._revalidate()
+        return self.value if self.value is not None else self.fallback
+
+    def _is_stale(self):
+        now = time.monotonic()
+        return (now - self.fetched_at) > self.ttl and (now - self.failed_at) > RETRY_SECONDS
+
+    def _revalidate(self):
+        # Single flight: concurrent readers and the scheduler share one upstream call
+        if self._inflight is None or self._inflight.done():
+            self._inflight = asyncio.create_task(self._run())
+        return self._inflight
+
+    async def refresh(self):
+        await asyncio.shield(self._revalidate())
+
+    async def _run(self):
+        value = await self.fetch()
+        if value is None:
+            self.failed_at = time.monotonic()
+            print(f"⚠️ Market context: {self.name} refresh failed, serving the previous value.")
+            return
+        self.value = value
+        self.fetched_at = time.monotonic()
+
+fear_and_greed = CachedFetch("fear & greed", fetch_fear_and_greed, SENTIMENT_TTL, {"value": "50", "sentiment": "Neutral"})
+global_movers = CachedFetch("global movers", fetch_global_movers, MOVERS_TTL, {"top_gainers": []})
+
+# Each is refreshed by its own scheduler job every `ttl`, so global briefings are served from memory
+MARKET_CONTEXT = (fear_and_greed, global_movers)
@@ -1,5 +1,5 @@
 from sqlalchemy.orm import DeclarativeBase
-from sqlalchemy import Column, DateTime, Float, String, Integer, Boolean, func, Text
+from sqlalchemy import Column, DateTime, Float, String, Integer, Boolean, func, Text, UniqueConstraint
 from datetime import datetime
 
 class Base(DeclarativeBase):
@@ -19,6 +19,34 @@ class Stock(Base):
     # low = Column(Float)
     # volume = Column(Float)
 
+class OHLCMixin:
+    """Shared columns for the candle rollups the ingest path maintains from raw ticks."""
+    id = Column(Integer, primary_key=True)
+    symbol = Column(String(10), nullable=False)
+    bucket = Column(DateTime, nullable=False)   # Start of the candle
+    open = Column(Float, nullable=False)
+    high = Column(Float, nullable=False)
+    low = Column(Float, nullable=False)
+    close = Column(Float, nullable=False)
+    ticks = Column(Integer, nullable=False, default=1)  # Oracle ticks folded in (we have no traded volume)
+    open_at = Column(DateTime, nullable=False)  # Tick times behind open/close, so late ticks land in order
+    close_at = Column(DateTime, nullable=False)
+
+class StockOHLC1m(OHLCMixin, Base):
+    __tablename__ = "stocks_ohlc_1m"
+    __table_args__ = (UniqueConstraint("symbol", "bucket", name="uq_ohlc_1m_symbol_bucket"),)
+
+class StockOHLC1h(OHLCMixin, Base):
+    __tablename__ = "stocks_ohlc_1h"
+    __table_args__ = (UniqueConstraint("symbol", "bucket", name="uq_ohlc_1h_symbol_bucket"),)
+
+class StockOHLC1d(OHLCMixin, Base):
+    __tablename__ = "stocks_ohlc_1d"
+    __table_args__ = (UniqueConstraint("symbol", "bucket", name="uq_ohlc_1d_symbol_bucket"),)
+
+# Resolution name -> rollup model, shared by the writer and the history endpoint
+OHLC_MODELS = {"1m": StockOHLC1m, "1h": StockOHLC1h, "1d": StockOHLC1d}
+
 class TokenMap(Base):
     __tablename__ = "token_map"
     
@@ -41,10 +69,20 @@ class PredictionLog(Base):
     confidence = Column(Float)
     price_at_prediction = Column(Float)
     timestamp = Column(DateTime, default=func.now())
-    was_correct = Column(Boolean, nullable=True) # To be updated after 1 hour
+    horizon_minutes = Column(Integer, nullable=False, default=60) # Graded against the price at timestamp + horizon
+    was_correct = Column(Boolean, nullable=True) # To be updated once the horizon has passed
     was_evaluated = Column(Boolean, default=False)
     actual_price_later = Column(Float, nullable=True)
 
+class AgentScoreboard(Base):
+    __tablename__ = "agent_scoreboard"
+
+    symbol = Column(String(10), primary_key=True)
+    wins = Column(Integer, nullable=False, default=0)
+    total = Column(Integer, nullable=False, default=0)   # Evaluated predictions
+    streak = Column(Integer, nullable=False, default=0)  # Positive for win streak, negative for loss
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
 class InvestorBehavior(Base):
     __tablename__ = "investor_behavior"
     id = Column(Integer, primary_key=True)
@@ -0,0 +1,167 @@
+import hashlib
+import json
+from collections import namedtuple
+import numpy as np
+from sqlalchemy import func, select
+from models import Stock, TokenMap
+
+RING_CAPACITY = 256  # Covers the 100-tick analysis window with room to spare
+
+# Drop-in for the Stock rows get_recent_prices used to return (callers only read .price/.datetime)
+PricePoint = namedtuple("PricePoint", ["symbol", "price", "datetime"])
+
+class PriceRing:
+    """Fixed-size circular buffer of recent ticks for one symbol, backed by NumPy arrays."""
+    __slots__ = ("symbol", "prices", "times", "head", "size")
+
+    def __init__(self, symbol: str, capacity: int = RING_CAPACITY):
+        self.symbol = symbol
+        self.prices = np.empty(capacity, dtype=np.float64)
+        self.times = np.empty(capacity, dtype="datetime64[us]")
+        self.head = 0  # Next slot to write
+        self.size = 0
+
+    def append(self, dt, price: float):
+        self.times[self.head] = dt
+        self.prices[self.head] = price
+        self.head = (self.head + 1) % len(self.prices)
+        self.size = min(self.size + 1, len(self.prices))
+
+    def latest(self, limit: int):
+        """Newest-first PricePoints, same order as get_recent_prices."""
+        n = min(limit, self.size)
+        idx = (self.head - 1 - np.arange(n)) % len(self.prices)
+        return [PricePoint(self.symbol, p, t) for p, t in zip(self.prices[idx].tolist(), self.times[idx].tolist())]
+
+class PriceCache:
+    """
+    One PriceRing per symbol. The ingest path records every tick and startup warms the
+    rings from the DB, so a warmed symbol is answered without touching MySQL. A ring that
+    started empty at runtime (token activated later, ticks learned from the bus) is only
+    trusted once it holds `limit` ticks; until then the DB answers and seeds it.
+    """
+    def __init__(self, capacity: int = RING_CAPACITY):
+        self.capacity = capacity
+        self.rings = {}
+        self.warmed = set()  # Symbols whose ring holds the newest stored history
+
+    def _ring(self, symbol: str):
+        ring = self.rings.get(symbol)
+        if ring is None:
+            ring = self.rings[symbol] = PriceRing(symbol, self.capacity)
+        return ring
+
+    def record(self, ticks: list):
+        """Appends (symbol, price, datetime) ticks, oldest first."""
+        for symbol, price, dt in ticks:
+            self._ring(symbol).append(dt, price)
+
+    def recent(self, symbol: str, limit: int = 10):
+        """Newest-first ticks, or None when the cache can't answer (unknown symbol or limit > capacity)."""
+        ring = self.rings.get(symbol)
+        if ring is None or limit > self.capacity:
+            return None
+        if symbol not in self.warmed and ring.size < limit:
+            return None # Partial ring, the DB may know more
+        return ring.latest(limit)
+
+    def tickers(self, live: dict = None):
+        """
+        {symbol: {"price", "change"}} from each ring's last two ticks. `live` ({symbol: price})
+        overlays prices newer than the ring, whose change is then taken against the last stored tick.
+        """
+        live = live or {}
+        result = {}
+        for symbol, ring in self.rings.items():
+            latest = ring.latest(2)
+            if not latest:
+                continue
+
+            if symbol in live:
+                current, prev = live[symbol], latest[0].price
+            else:
+                current = latest[0].price
+                prev = latest[1].price if len(latest) > 1 else None
+            change = 0
+            if prev:
+                change = ((current - prev) / prev) * 100
+
+            result[symbol] = {
+                "price": current,
+                "change": round(change, 2)
+            }
+        return result
+
+    def wants_seed(self, symbol: str):
+        return symbol in self.rings and symbol not in self.warmed
+
+    def seed(self, symbol: str, rows: list):
+        """
+        Rebuilds a runtime ring from newest-first stored rows (Stock or PricePoint). Ticks the
+        ring recorded after the newest row are kept, so nothing ingested meanwhile is lost.
+        """
+        old = self.rings.get(symbol)
+        ring = PriceRing(symbol, self.capacity)
+        for row in reversed(rows[:self.capacity]):
+            ring.append(row.datetime, row.price)
+        if old is not None:
+            newest = np.datetime64(rows[0].datetime, "us") if rows else None
+            for point in reversed(old.latest(old.size)):
+                if newest is None or np.datetime64(point.datetime, "us") > newest:
+                    ring.append(point.datetime, point.price)
+        self.rings[symbol] = ring
+        self.warmed.add(symbol)
+
+    def drop(self, symbols):
+        for symbol in symbols:
+            self.rings.pop(symbol, None)
+            self.warmed.discard(symbol)
+
+    def warm(self, db):
+        """Loads the newest `capacity` ticks of every active token with one windowed query."""
+        active = select(TokenMap.symbol).where(TokenMap.is_active == True)
+        ranked = (
+            select(
+                Stock.symbol,
+                Stock.price,
+                Stock.datetime,
+                func.row_number().over(partition_by=Stock.symbol, order_by=Stock.datetime.desc()).label("rn")
+            )
+            .where(Stock.symbol.in_(active))
+            .subquery()
+        )
+        rows = db.execute(
+            select(ranked.c.symbol, ranked.c.price, ranked.c.datetime)
+            .where(ranked.c.rn <= self.capacity)
+            .order_by(ranked.c.symbol, ranked.c.datetime.asc())
+        ).all()
+
+        # Active tokens without history still get an (empty) ring, so they don't fall back to the DB
+        for symbol in db.execute(active).scalars():
+            self._ring(symbol)
+        self.record(rows)
+        self.warmed.update(self.rings)
+        print(f"🧠 [LUCY] Price cache warmed: {len(rows)} ticks across {len(self.rings)} symbols.")
+
+TickerSnapshot = namedtuple("TickerSnapshot", ["version", "etag", "body", "tickers"])
+
+class TickerBoard:
+    """
+    Holds the pre-serialized /tickers payload. Each sync cycle builds a new snapshot and
+    swaps it in with a single assignment, so readers always see a complete one.
+    """
+    def __init__(self):
+        self.current = TickerSnapshot(0, '"0-empty"', b"{}", {})
+
+    def refresh(self, tickers: dict):
+        body = json.dumps(tickers, separators=(",", ":")).encode()
+        if body == self.current.body:
+            return self.current # Nothing moved, keep the ETag stable for pollers
+
+        version = self.current.version + 1
+        etag = f'"{version}-{hashlib.blake2b(body, digest_size=8).hexdigest()}"'
+        self.current = TickerSnapshot(version, etag, body, tickers)
+        return self.current
+
+price_cache = PriceCache()
+ticker_board = TickerBoard()
@@ -1,12 +1,14 @@
+import asyncio
 import os
 from dotenv import load_dotenv
 from fastapi import Depends, APIRouter
 from collections import deque
-from sqlalchemy.orm import Session
-from brain import classify_user_intent, get_market_prediction, get_agent_stats # <--- THE NEW BRAIN
-from utils import extract_symbol, mine_investor_behavior, get_fear_and_greed, get_global_movers
-from database import get_db, get_recent_prices
-from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
+from brain import classify_user_intent, classify_user_intents, get_market_prediction, get_agent_stats_async, analyze_divergence_async # <--- THE NEW BRAIN
+from utils import extract_symbol, extract_symbols, mine_investor_behavior_async
+from market_context import fear_and_greed, global_movers
+from database import get_async_db, get_recent_prices_async
+from pydantic import BaseModel, Field
 from google import genai
 from google.genai import types
 
@@ -57,14 +59,23 @@ class ChatRequest(BaseModel):
     content: str
     session_id: str
 
+class ClassifyRequest(BaseModel):
+    messages: list[str] = Field(..., max_length=5000)
+
 class ChatResponse(BaseModel):
     reply: str
     prediction_type: str
     probability: float
 
+@router.post("/classify")
+async def classify_messages(request: ClassifyRequest):
+    # One feature/predict pass for the whole batch, kept off the event loop
+    intents = await asyncio.to_thread(classify_user_intents, request.messages)
+    return {"intents": intents}
+
 @router.get("/token-stats/{symbol}")
-async def fetch_token_stats(symbol: str, db: Session = Depends(get_db)):
-    win_rate, total, streak = get_agent_stats(db, symbol)
+async def fetch_token_stats(symbol: str, db: AsyncSession = Depends(get_async_db)):
+    win_rate, total, streak = await get_agent_stats_async(db, symbol)
     return {
         "win_rate": win_rate,
         "total_trades": total,
@@ -72,25 +83,28 @@ async def fetch_token_stats(symbol: str, db: Session = Depends(get_db)):
     }
 
 @router.post("/reply")
-async def chat_agent_reply(request: ChatRequest, db: Session = Depends(get_db)):
+async def chat_agent_reply(request: ChatRequest, db: AsyncSession = Depends(get_async_db)):
     # Step 1: What is the user talking about?
     intent = classify_user_intent(request.content)
     
     if intent == "market_query":
         # Step 2: Analyze the specific token (e.g., BTC)
-        symbol = extract_symbol(db, request.content)
+        # In-memory automaton, no DB round trip; the first ticker wins, every mention is reported
+        symbol = extract_symbol(request.content, request.session_id)
+        mentioned = extract_symbols(request.content)
 
         if (symbol):
-            prices = get_recent_prices(symbol, db)
+            prices = await get_recent_prices_async(symbol, db)
             
             if not prices:
                 return {"reply": f"I see you're asking about {symbol}, but I don't have enough data in my memory yet!"}
             
-            behavior_context = mine_investor_behavior(db, symbol)
+            behavior_context = await mine_investor_behavior_async(db, symbol)
             if (behavior_context == "No recent whale activity detected (Insufficient Data)"):
                 return {"reply": behavior_context}
             
-            sent, conf, insight = get_market_prediction(db, prices, symbol, behavior_context)
+            divergence_report = await analyze_divergence_async(db, symbol)
+            sent, conf, insight = get_market_prediction(db, prices, symbol, behavior_context, divergence_report)
 
             try :
                 narration = await lucy_brain.get_narration(
@@ -106,6 +120,7 @@ async def chat_agent_reply(request: ChatRequest, db: Session = Depends(get_db)):
                 return {
                     "reply": narration,
                     "symbol": symbol,
+                    "symbols": mentioned,
                     "prediction_type": sent,
                     "probability": conf,
                     "insight_text": insight
@@ -114,13 +129,14 @@ async def chat_agent_reply(request: ChatRequest, db: Session = Depends(get_db)):
                 return {
                     "reply": insight,
                     "symbol": symbol,
+                    "symbols": mentioned,
                     "prediction_type": sent,
                     "probability": conf,
                     "insight_text": insight
                 }
     elif intent == "global_market_query":
-        sentiment = get_fear_and_greed()
-        movers = get_global_movers()
+        # Served from memory; a stale value triggers one background refresh instead of a blocking call
+        sentiment, movers = await asyncio.gather(fear_and_greed.get(), global_movers.get())
 
         prompt = f"""
         The user is asking about the general market. 
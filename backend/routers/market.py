@@ -1,88 +1,117 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from sqlalchemy import func, select, text as sql_text
-from brain import analyze_divergence
-from database import get_db
-from models import TokenMap, Stock  # Ensure these are your model classes
-from utils import get_tokens
+import os
+import numpy as np
+from datetime import datetime, timedelta
+from typing import Literal
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from brain import analyze_divergence_async
+from database import get_async_db
+from downsample import lttb_indices
+from price_cache import ticker_board
+from models import OHLC_MODELS, Stock  # Ensure these are your model classes
+from token_catalog import token_catalog
 
 router = APIRouter(prefix="/api/market", tags=["market"])
 
 # --- ENDPOINTS ---
 
 @router.get("/web3-list")
-async def get_web3_token_list(db: Session = Depends(get_db)):
-    # 1. Fetch live "Discovery" list from CoinGecko
-    tokens = await get_tokens() 
-    
-    # 2. Get active mappings from our DB
-    mappings = db.query(TokenMap).filter(TokenMap.is_active == True).all()
-    pyth_lookup = {m.symbol: m.pyth_id for m in mappings}
+async def get_web3_token_list(
+    q: str = Query("", description="Symbol prefix, case-insensitive"),
+    cursor: str | None = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(50, ge=1, le=500),
+    has_pro_feed: bool | None = None,
+    active: bool | None = None
+):
+    """One page of the Pyth/CoinGecko discovery catalogue, enriched with TokenMap and sorted by symbol."""
+    await token_catalog.ensure()
+    try:
+        return token_catalog.page(q, cursor, limit, has_pro_feed, active)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    # 3. Enrich the data for the Frontend
-    for token in tokens:
-        symbol = token.symbol.upper()
-        pyth_id = pyth_lookup.get(symbol)
-        
-        token.has_pro_feed = pyth_id is not None
-        token.pyth_id = pyth_id
-        
-    return tokens
+# Finest table that keeps a window of this length to a modest row count
+AUTO_RESOLUTIONS = [(timedelta(hours=6), "raw"), (timedelta(days=7), "1m"), (timedelta(days=365), "1h")]
+# Rows read before downsampling; a window holding more keeps its newest rows
+HISTORY_ROW_CAP = int(os.getenv("LUCY_HISTORY_ROW_CAP", 100000))
+
+def _history_query(symbol: str, resolution: str, start_dt: datetime, end_dt: datetime):
+    """Newest-first rows of (time, *values) for the window, capped at HISTORY_ROW_CAP."""
+    if resolution == "raw":
+        query = (
+            select(Stock.datetime, Stock.price)
+            .where(Stock.symbol == symbol, Stock.datetime.between(start_dt, end_dt))
+            .order_by(Stock.datetime.desc())
+        )
+    else:
+        model = OHLC_MODELS[resolution]
+        query = (
+            select(model.bucket, model.open, model.high, model.low, model.close)
+            .where(model.symbol == symbol, model.bucket.between(start_dt, end_dt))
+            .order_by(model.bucket.desc())
+        )
+    return query.limit(HISTORY_ROW_CAP)
 
 @router.get("/history/{symbol}")
-async def get_history(symbol: str, db: Session = Depends(get_db)):
-    """Provides data for amCharts visuals."""
-    query = sql_text("SELECT price, datetime FROM stocks WHERE symbol = :s ORDER BY datetime ASC LIMIT 1000")
-    rows = db.execute(query, {"s": symbol}).mappings().all()
-    return [{"datetime": int(r['datetime'].timestamp() * 1000), "price": float(r['price'])} for r in rows]
+async def get_history(
+    symbol: str,
+    start: int | None = Query(None, alias="from", description="Window start in epoch ms (default: 24h before `to`)"),
+    end: int | None = Query(None, alias="to", description="Window end in epoch ms (default: now)"),
+    max_points: int = Query(1000, ge=3, le=10000),
+    resolution: Literal["auto", "raw", "1m", "1h", "1d"] = "auto",
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Provides data for amCharts visuals. The window is read from the raw ticks or an
+    OHLC rollup (at most HISTORY_ROW_CAP rows, newest kept) and LTTB-downsampled to at
+    most `max_points` points.
+    """
+    end_dt = datetime.fromtimestamp(end / 1000) if end is not None else datetime.now()
+    start_dt = datetime.fromtimestamp(start / 1000) if start is not None else end_dt - timedelta(hours=24)
 
-@router.get("/tickers")
-async def get_all_tickers(db: Session = Depends(get_db)):
-    # 1. Create a "Ranked" subquery to find the 2 most recent prices per symbol
-    # This replaces the need for separate loops or hardcoded dicts
-    ranked_subquery = (
-        select(
-            Stock.symbol,
-            Stock.price,
-            func.row_number().over(
-                partition_by=Stock.symbol, 
-                order_by=Stock.datetime.desc()
-            ).label("rn")
-        )
-        .where(Stock.symbol.in_(select(TokenMap.symbol).where(TokenMap.is_active == True)))
-        .subquery()
-    )
+    auto = resolution == "auto"
+    if auto:
+        span = end_dt - start_dt
+        resolution = next((res for limit, res in AUTO_RESOLUTIONS if span <= limit), "1d")
+
+    rows = (await db.execute(_history_query(symbol, resolution, start_dt, end_dt))).all()
+    if not rows and auto and resolution != "raw":
+        # Rollups only fill in as ticks are ingested; until then answer from the raw ticks
+        resolution = "raw"
+        rows = (await db.execute(_history_query(symbol, resolution, start_dt, end_dt))).all()
+    if not rows:
+        return JSONResponse([])
+    rows.reverse()
+    names = ("price",) if resolution == "raw" else ("open", "high", "low", "close")
 
-    # 2. Fetch only the top 2 rows (current and previous)
-    query = select(ranked_subquery).where(ranked_subquery.c.rn <= 2)
-    rows = db.execute(query).mappings().all()
+    # Column-wise arrays; LTTB runs on the price (or close) series and picks whole rows
+    times, *series = zip(*rows)
+    values = np.array(series, dtype=np.float64)
+    x = np.array(times, dtype="datetime64[ms]").astype(np.int64)
+    keep = lttb_indices(x, values[-1], max_points)
 
-    # 3. Format into { "BTC": {"price": 100, "change": 1.5}, ... }
-    tickers = {}
-    for row in rows:
-        sym = row['symbol']
-        price = float(row['price'])
-        
-        if sym not in tickers:
-            tickers[sym] = {"current": price, "prev": None}
-        else:
-            tickers[sym]["prev"] = price
+    points = []
+    for i, vals in zip(keep.tolist(), values[:, keep].T.tolist()):
+        point = {"datetime": int(times[i].timestamp() * 1000), **dict(zip(names, vals))}
+        if resolution != "raw":
+            point["price"] = point["close"]
+        points.append(point)
 
-    # 4. Final calculation
-    result = {}
-    for sym, p in tickers.items():
-        change = 0
-        if p['prev'] and p['prev'] != 0:
-            change = ((p['current'] - p['prev']) / p['prev']) * 100
-        
-        result[sym] = {
-            "price": p['current'],
-            "change": round(change, 2)
-        }
+    # Already plain floats/ints, so skip FastAPI's per-item jsonable_encoder walk
+    return JSONResponse(points)
 
-    return result
+@router.get("/tickers")
+async def get_all_tickers(request: Request):
+    # Pre-serialized snapshot swapped in by the sync loop; pollers revalidate with If-None-Match
+    snapshot = ticker_board.current
+    headers = {"ETag": snapshot.etag, "X-Ticker-Version": str(snapshot.version), "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == snapshot.etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=snapshot.body, media_type="application/json", headers=headers)
 
 @router.get("/insight/{symbol}")
-async def get_token_insight(symbol: str, db: Session = Depends(get_db)):
-    insight = analyze_divergence(db, symbol.upper())
+async def get_token_insight(symbol: str, db: AsyncSession = Depends(get_async_db)):
+    insight = await analyze_divergence_async(db, symbol.upper())
     return {"symbol": symbol, "insight": insight}
\ No newline at end of file
@@ -0,0 +1,131 @@
+import time
+from sqlalchemy import select, text as sql_text
+from models import AgentScoreboard, PredictionLog
+
+MIRROR_TTL = 60.0  # Seconds before a mirrored entry is re-read, in case another worker judged it
+
+def _run_length(verdicts: list):
+    """Signed length of the trailing run of equal verdicts (+ for wins, - for losses)."""
+    last = verdicts[-1]
+    run = 0
+    for was_correct in reversed(verdicts):
+        if was_correct != last:
+            break
+        run += 1
+    return run if last else -run
+
+def _extend_streak(streak: int, verdicts: list):
+    run = _run_length(verdicts)
+    # The batch only continues the old streak if every verdict in it points the same way
+    if abs(run) == len(verdicts) and (streak > 0) == (run > 0) and streak != 0:
+        return streak + run
+    return run
+
+class Scoreboard:
+    """
+    Per-symbol wins / total / current streak, maintained by the judge as verdicts land.
+    The agent_scoreboard table is the source of truth; `entries` mirrors it so stats
+    reads are O(1) instead of re-counting PredictionLog.
+    """
+    def __init__(self):
+        self.entries = {}  # symbol -> (wins, total, streak, loaded_at)
+
+    def _remember(self, symbol: str, wins: int, total: int, streak: int):
+        self.entries[symbol] = (wins, total, streak, time.monotonic())
+
+    def _cached(self, symbol: str):
+        entry = self.entries.get(symbol)
+        if entry is None or (time.monotonic() - entry[3]) > MIRROR_TTL:
+            return None
+        return entry
+
+    @staticmethod
+    def _format(entry):
+        wins, total, streak = entry[0], entry[1], entry[2]
+        win_rate = (wins / total * 100) if total > 0 else 0
+        return round(win_rate, 2), total, streak
+
+    def stats(self, db, symbol: str):
+        """(win_rate, total_trades, streak) for a symbol."""
+        entry = self._cached(symbol)
+        if entry is None:
+            row = db.get(AgentScoreboard, symbol)
+            self._remember(symbol, row.wins if row else 0, row.total if row else 0, row.streak if row else 0)
+            entry = self.entries[symbol]
+        return self._format(entry)
+
+    async def stats_async(self, db, symbol: str):
+        entry = self._cached(symbol)
+        if entry is None:
+            row = await db.get(AgentScoreboard, symbol)
+            self._remember(symbol, row.wins if row else 0, row.total if row else 0, row.streak if row else 0)
+            entry = self.entries[symbol]
+        return self._format(entry)
+
+    def record_verdicts(self, db, symbol: str, verdicts: list):
+        """
+        Folds a symbol's new verdicts (oldest first) into its scoreboard row.
+        Runs inside the judge's transaction; the caller commits.
+        """
+        if not verdicts:
+            return
+        wins = sum(1 for v in verdicts if v)
+        run = _run_length(verdicts)
+        extends = abs(run) == len(verdicts)
+
+        db.execute(sql_text("""
+            INSERT INTO agent_scoreboard (symbol, wins, total, streak, updated_at)
+            VALUES (:s, :w, :t, :run, NOW())
+            ON DUPLICATE KEY UPDATE
+                streak = IF(:extends AND streak != 0 AND SIGN(streak) = SIGN(VALUES(streak)), streak + VALUES(streak), VALUES(streak)),
+                wins = wins + VALUES(wins),
+                total = total + VALUES(total),
+                updated_at = VALUES(updated_at)
+        """), {"s": symbol, "w": wins, "t": len(verdicts), "run": run, "extends": extends})
+
+        entry = self.entries.get(symbol)
+        if entry is not None:
+            self._remember(symbol, entry[0] + wins, entry[1] + len(verdicts), _extend_streak(entry[2], verdicts))
+
+    def _store(self, db, symbol: str, wins: int, total: int, streak: int):
+        """Writes absolute counts recomputed from PredictionLog; safe to repeat, unlike record_verdicts."""
+        db.execute(sql_text("""
+            INSERT INTO agent_scoreboard (symbol, wins, total, streak, updated_at)
+            VALUES (:s, :w, :t, :streak, NOW())
+            ON DUPLICATE KEY UPDATE
+                wins = VALUES(wins),
+                total = VALUES(total),
+                streak = VALUES(streak),
+                updated_at = VALUES(updated_at)
+        """), {"s": symbol, "w": wins, "t": total, "streak": streak})
+        self._remember(symbol, wins, total, streak)
+
+    def warm(self, db):
+        """Loads the table into the mirror. Read-only, so every worker runs it."""
+        for row in db.execute(select(AgentScoreboard)).scalars():
+            self._remember(row.symbol, row.wins, row.total, row.streak)
+        print(f"🏆 [LUCY] Scoreboard loaded for {len(self.entries)} symbols.")
+
+    def backfill(self, db):
+        """Writes rows for symbols judged before the scoreboard existed. Leader only."""
+        known = db.execute(select(AgentScoreboard.symbol)).scalars().all()
+        evaluated = db.execute(
+            select(PredictionLog.symbol)
+            .where(PredictionLog.was_evaluated == True, PredictionLog.was_correct != None, PredictionLog.symbol.not_in(known))
+            .group_by(PredictionLog.symbol)
+        ).scalars().all()
+
+        for symbol in evaluated:
+            history = db.execute(
+                select(PredictionLog.was_correct)
+                .where(PredictionLog.symbol == symbol, PredictionLog.was_evaluated == True, PredictionLog.was_correct != None)
+                .order_by(PredictionLog.timestamp.asc())
+            ).scalars().all()
+            verdicts = [bool(v) for v in history]
+            self._store(db, symbol, sum(verdicts), len(verdicts), _run_length(verdicts))
+
+        if evaluated:
+            db.commit()
+            print(f"🏆 [LUCY] Scoreboard backfilled {len(evaluated)} symbols from the prediction log.")
+
+scoreboard = Scoreboard()
@@ -1,5 +1,5 @@
 from utils import get_tokens
-from database import SessionLocal, engine
+from database import SessionLocal, db_apply_schema_patches, engine
 from sqlalchemy import func
 from models import Base, InvestorBehavior, TokenMap   # Ensure TokenMap is defined in models.py
 import random
@@ -60,6 +60,7 @@ def seed_whale_data():
 async def run_all_seeds():
     # 1. Initialize MySQL Tables
     Base.metadata.create_all(bind=engine)
+    db_apply_schema_patches()
     
     # 2. Seed the Token Map
     await seed_web3_tokens()
@@ -0,0 +1,158 @@
+import asyncio
+import json
+import os
+import time
+from datetime import datetime
+import httpx
+from database import SessionLocal
+from models import TokenMap
+from tasks import broadcast_price_ticks, process_price_updates
+from http_pool import http_pool
+from utils import HERMES_URL, normalize_feed_id, parse_pyth_price
+
+STREAM_PATH = "/v2/updates/price/stream"
+
+class HermesStreamEngine:
+    """
+    Keeps one long-lived SSE connection to Hermes for every active feed. Updates are
+    coalesced per symbol: every `flush_interval` the latest ticks are broadcast, and every
+    `db_interval` the latest price per token goes through tasks.process_price_updates,
+    so a burst of ticks costs one broadcast per flush and one stored row per save.
+    """
+    def __init__(self, ws_manager, flush_interval: float = 0.5, db_interval: float = 30.0,
+                 behavior_interval: float = 30.0, resubscribe_interval: float = 600.0,
+                 reconnect_delay: float = 1.0, max_reconnect_delay: float = 30.0, base_url: str = None):
+        self.ws_manager = ws_manager
+        self.flush_interval = flush_interval
+        self.db_interval = db_interval                  # `stocks` keeps the old 30s row cadence
+        self.behavior_interval = behavior_interval      # Whale lookups stay on the old 30s cadence
+        self.resubscribe_interval = resubscribe_interval  # Reconnect periodically to pick up TokenMap changes
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.base_url = base_url or os.getenv("HERMES_STREAM_URL", HERMES_URL)
+
+        self.stats = {"events": 0, "flushes": 0, "saves": 0, "reconnects": 0}
+        self._pending = {}  # symbol -> (TokenMap, latest price), overwritten until the next flush
+        self._unsaved = {}  # Same, until the next save
+        self._tasks = []
+
+    async def start(self):
+        self._tasks = [
+            asyncio.create_task(self._stream_loop()),
+            asyncio.create_task(self._flush_loop()),
+            asyncio.create_task(self._save_loop())
+        ]
+        print(f"📡 [LUCY] Hermes stream engine started ({self.base_url}).")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # Don't lose the ticks received since the last flush and save
+        await self.flush()
+        await self.save()
+
+    def _load_tokens(self):
+        with SessionLocal() as db:
+            tokens = db.query(TokenMap).filter(TokenMap.is_active == True, TokenMap.pyth_id != None).all()
+        return {normalize_feed_id(t.pyth_id): t for t in tokens}
+
+    async def _stream_loop(self):
+        delay = self.reconnect_delay
+        while True:
+            tokens = self._load_tokens()
+            if not tokens:
+                await asyncio.sleep(self.resubscribe_interval)
+                continue
+
+            received = self.stats["events"]
+            try:
+                await self._consume(tokens)
+                delay = self.reconnect_delay
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # A connection that delivered data was healthy; start the backoff over
+                if self.stats["events"] > received:
+                    delay = self.reconnect_delay
+                self.stats["reconnects"] += 1
+                print(f"🔌 Hermes stream dropped ({type(e).__name__}: {e}). Reconnecting in {delay:.0f}s...")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_reconnect_delay)
+
+    async def _consume(self, tokens: dict):
+        url = f"{self.base_url}{STREAM_PATH}"
+        params = {"ids[]": [t.pyth_id for t in tokens.values()], "parsed": "true", "ignore_invalid_price_ids": "true"}
+        deadline = time.monotonic() + self.resubscribe_interval
+
+        # Hermes pushes roughly every 400ms, so a 30s read timeout means the connection is dead
+        async with http_pool.stream("GET", url, params=params, timeout=httpx.Timeout(10.0, read=30.0)) as response:
+            if response.status_code != 200:
+                raise ConnectionError(f"Hermes stream answered {response.status_code}")
+
+            print(f"📡 Hermes stream connected for {len(tokens)} feeds.")
+            async for line in response.aiter_lines():
+                if line.startswith("data:"):
+                    self._handle_event(line[5:].strip(), tokens)
+                if time.monotonic() > deadline:
+                    return
+
+    def _handle_event(self, data: str, tokens: dict):
+        try:
+            payload = json.loads(data)
+        except ValueError:
+            return
+
+        for feed in payload.get("parsed", []):
+            token = tokens.get(normalize_feed_id(feed.get("id", "")))
+            if token is None:
+                continue
+            update = (token, parse_pyth_price(token.pyth_id, feed.get("price", {})))
+            self._pending[token.symbol] = update
+            self._unsaved[token.symbol] = update
+            self.stats["events"] += 1
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def _save_loop(self):
+        while True:
+            await asyncio.sleep(self.db_interval)
+            await self.save()
+
+    async def flush(self):
+        """Broadcasts the latest tick per symbol; the DB and the price cache only change on save."""
+        if not self._pending:
+            return
+        updates, self._pending = list(self._pending.values()), {}
+        now = datetime.now()
+        ticks = [(token.symbol, price, now) for token, price in updates if price and price != "STALE"]
+        if not ticks:
+            return
+
+        try:
+            await broadcast_price_ticks(self.ws_manager, ticks)
+            self.stats["flushes"] += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"🚨 Stream flush error: {e}")
+
+    async def save(self):
+        """Stores the latest price per token and runs the analysis path; STALE feeds are pruned here."""
+        if not self._unsaved:
+            return
+        updates, self._unsaved = list(self._unsaved.values()), {}
+
+        try:
+            with SessionLocal() as db:
+                await process_price_updates(db, self.ws_manager, updates,
+                                            behavior_interval=self.behavior_interval, broadcast=False)
+            self.stats["saves"] += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"🚨 Stream save error: {e}")
@@ -0,0 +1,116 @@
+from collections import deque
+from models import TokenMap
+
+MIN_SYMBOL_LENGTH = 3 # Shorter uppercase runs ("I", "OK", "AI") are mostly not tickers
+MIN_NAME_LENGTH = 4
+# Spoken names that aren't CoinGecko names, always understood
+ALIASES = {"bitcoin": "BTC", "ethereum": "ETH", "solana": "SOL", "doge": "DOGE"}
+# Match strength: a capitalised ticker beats a curated alias, which beats a discovery name
+# (many of those are plain words: "near", "flow", "render")
+KIND_RANK = {"symbol": 0, "alias": 1, "name": 2}
+
+# ASCII-only lowering keeps every index of the folded text aligned with the original
+_ASCII_LOWER = str.maketrans("ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz")
+
+def _is_word_char(ch: str):
+    return ch.isalnum() or ch == "_"
+
+class SymbolMatcher:
+    """
+    Aho-Corasick automaton over every TokenMap symbol (matched case-sensitively, "BTC") and
+    CoinGecko name ("bitcoin", any case). One pass over the case-folded text finds every
+    candidate; word boundaries and symbol case are checked per hit, so lookups never touch the DB.
+    """
+    def __init__(self):
+        self._goto = [{}]   # state -> {char: state}
+        self._fail = [0]
+        self._out = [[]]    # state -> [(length, kind, surface, symbol)]
+        self.size = 0
+        self.known_names = {}  # Last good {lowercase name: symbol} from discovery, kept when it fails
+
+    def build(self, symbols, names: dict):
+        """`symbols`: ticker strings; `names`: {lowercase name: symbol}."""
+        goto, fail, out = [{}], [0], [[]]
+
+        def add(key: str, pattern):
+            state = 0
+            for ch in key:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][ch] = nxt
+                    goto.append({})
+                    fail.append(0)
+                    out.append([])
+                state = nxt
+            out[state].append(pattern)
+
+        count = 0
+        for symbol in set(symbols):
+            if symbol and len(symbol) >= MIN_SYMBOL_LENGTH:
+                add(symbol.translate(_ASCII_LOWER), (len(symbol), "symbol", symbol, symbol))
+                count += 1
+        for name, symbol in names.items():
+            if len(name) >= MIN_NAME_LENGTH and name not in ALIASES:
+                add(name, (len(name), "name", name, symbol))
+                count += 1
+        for name, symbol in ALIASES.items():
+            add(name, (len(name), "alias", name, symbol))
+            count += 1
+
+        # Breadth-first failure links; each state inherits the outputs of its failure state
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in goto[state].items():
+                queue.append(nxt)
+                f = fail[state]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(ch, 0)
+                out[nxt] = out[nxt] + out[fail[nxt]]
+
+        # Swapped in together so concurrent readers see one complete automaton
+        self._goto, self._fail, self._out = goto, fail, out
+        self.size = count
+
+    def refresh(self, symbols, names: dict = None):
+        """Rebuilds for the current TokenMap symbols; `names` replaces the remembered discovery names."""
+        if names is not None:
+            self.known_names = names
+        tracked = set(symbols)
+        self.build(tracked, {name: symbol for name, symbol in self.known_names.items() if symbol in tracked})
+
+    def warm(self, db):
+        """Symbols only, plus any names already known; the token catalogue build supplies the rest."""
+        self.refresh([symbol for (symbol,) in db.query(TokenMap.symbol).all()])
+
+    def find(self, text: str):
+        """Non-overlapping (start, kind, symbol) matches in reading order, longest first at each position."""
+        goto, fail, out = self._goto, self._fail, self._out
+        folded = text.translate(_ASCII_LOWER)
+        hits = []
+        state = 0
+        for i, ch in enumerate(folded):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for length, kind, surface, symbol in out[state]:
+                start = i - length + 1
+                if start > 0 and _is_word_char(text[start - 1]):
+                    continue
+                if i + 1 < len(text) and _is_word_char(text[i + 1]):
+                    continue
+                if kind == "symbol" and text[start:i + 1] != surface:
+                    continue # Tickers only count when written in capitals
+                hits.append((start, -length, KIND_RANK[kind], kind, symbol))
+
+        # Leftmost, then longest, then strongest kind for the same span
+        matches, taken_until = [], 0
+        for start, neg_length, _, kind, symbol in sorted(hits):
+            if start >= taken_until:
+                matches.append((start, kind, symbol))
+                taken_until = start - neg_length
+        return matches
+
+symbol_matcher = SymbolMatcher()
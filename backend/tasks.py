@@ -1,15 +1,23 @@
 import asyncio
+import math
+import os
+from collections import defaultdict
 from datetime import datetime, timedelta
-import json
 import time
-from utils import format_lucy_log, mine_investor_behavior, fetch_pyth_price, fetch_dex_whales, map_to_investor_behavior, infer_whale_activity
-from database import SessionLocal, db_save_behavior, db_save_price, get_recent_prices, save_prediction_to_db
-from sqlalchemy import text as sql_text
+import numpy as np
+from utils import format_lucy_log, mine_investor_behavior_many, fetch_pyth_price, fetch_pyth_prices, fetch_dex_whales, map_to_investor_behavior, infer_whale_activity
+from database import SessionLocal, db_save_cycle, db_save_price, get_recent_prices, save_prediction_to_db
+from sqlalchemy import and_, case, or_, select, update, text as sql_text
 from models import TokenMap, Stock, PredictionLog
-from brain import get_market_prediction, get_agent_stats
+from price_cache import price_cache, ticker_board
+from token_catalog import token_catalog
+from scoreboard import scoreboard
+from asof import ASOF_EXPIRY, ASOF_TOLERANCE, DEFAULT_HORIZON, HORIZONS, asof_prices, to_epoch_seconds
+from brain import analyze_divergence_many, get_market_prediction, get_agent_stats
 
 sync_progress_store = {}
 analysis_cooldowns = {}
+behavior_refreshes = {}
 last_stats_update = time.time()
 
 async def check_for_data_gaps(symbol: str, threshold_hours: int = 2):
@@ -28,144 +36,303 @@ async def check_for_data_gaps(symbol: str, threshold_hours: int = 2):
             return last_dt
     return None
 
-limit_gate = asyncio.Semaphore(10)
-async def fetch_pyth_price_safe(pyth_id):
-    async with limit_gate: # Only 10 tasks can enter this block at once
-        try:
-            # Add a small explicit timeout and retry logic
-            return await fetch_pyth_price(pyth_id, timeout=10.0)
-        except Exception:
-            return None
+async def collect_behavior(db, token, price):
+    """Fetches DEX whale flow for a token, falling back to Ghost Whale inference."""
+    whale_data = await fetch_dex_whales(token.address) # 👈 Using your new column!
+
+    if whale_data:
+        return map_to_investor_behavior(token.symbol, whale_data['type'], whale_data['amount'])
+
+    # Fallback to Ghost Whale logic if DEX data is missing (current tick first, then the last saved one)
+    history = [Stock(symbol=token.symbol, price=price)] + get_recent_prices(token.symbol, db, limit=1)
+    inferred = infer_whale_activity(history)
+    return map_to_investor_behavior(token.symbol, inferred, 500.0)
+
+async def broadcast_price_ticks(ws_manager, ticks: list):
+    """
+    Pushes (symbol, price, datetime) ticks to ticker subscribers between saves. The price
+    cache is left alone: it mirrors the stored rows, which process_price_updates records.
+    """
+    live = {symbol: price for symbol, price, _ in ticks}
+    await ws_manager.publish_tickers(ticker_board.refresh(price_cache.tickers(live)))
+
+async def process_price_updates(db, ws_manager, updates, behavior_interval: float = 0, broadcast: bool = True):
+    """
+    Save-and-broadcast path shared by the polling loop and the Hermes stream engine.
+    `updates` is a list of (TokenMap, price) pairs; STALE feeds are pruned from TokenMap.
+    Whale behavior is refreshed at most once per `behavior_interval` seconds per token.
+    Pass `broadcast=False` when ticker subscribers are fed by broadcast_price_ticks; the
+    saved ticks still go into the price cache and to the other workers.
+    """
+    global last_stats_update
+    stale_ids = [token.pyth_id for token, price in updates if price == "STALE"]
+    live = [(token, price) for token, price in updates if price and price != "STALE"]
+
+    # 1. Collect every tick and whale reading for the cycle
+    now = datetime.now()
+    current_time = time.time()
+    ticks = [(token.symbol, price, now) for token, price in live]
+
+    due = [(token, price) for token, price in live
+           if (current_time - behavior_refreshes.get(token.symbol, 0)) > behavior_interval]
+    behaviors = await asyncio.gather(*(collect_behavior(db, token, price) for token, price in due))
+
+    # 2. Save both to DB in one transaction
+    if ticks or behaviors:
+        price_rows, behavior_rows = db_save_cycle(ticks, behaviors, db)
+        # The ring holds exactly the rows it stands in for, so analysis sees the stored cadence
+        price_cache.record(ticks)
+        await ws_manager.share_ticks(ticks)
+        if broadcast:
+            await ws_manager.publish_tickers(ticker_board.refresh(price_cache.tickers()))
+        print(f"💾 Cycle saved: {price_rows} prices, {behavior_rows} behaviors.")
+
+    for (token, price), data in zip(due, behaviors):
+        behavior_refreshes[token.symbol] = current_time
+        print(f"✅ Synced {token.symbol}: ${price:.4f} | Movement: {data['flow_type']}")
+
+    # 3. Reliability updates per token
+    for token, price in live:
+        if (current_time - last_stats_update) > 600: # Update reliability every 10 mins
+            win_rate, total_trades, streak = get_agent_stats(db, token.symbol)
+            
+            stats_payload = {
+                "type": "agent_stats",
+                "symbol": token.symbol,
+                "win_rate": round(win_rate, 2),
+                "total_trades": total_trades,
+                "streak": streak
+            }
+            await ws_manager.publish(stats_payload)
+            last_stats_update = current_time
+
+    # 4. Brain analysis for tokens off cooldown
+    analysis = []
+    for token, price in live:
+        last_run = analysis_cooldowns.get(token.symbol, 0)
+        if (current_time - last_run) > 300:
+            recent_prices = get_recent_prices(token.symbol, db, limit=100)
+            
+            # Check if we hit the threshold
+            if len(recent_prices) >= 10:
+                analysis.append((token, price, recent_prices))
+
+    # One aggregate query each covers the divergence and whale inputs of every token analysed this cycle
+    analysed_symbols = [token.symbol for token, _, _ in analysis]
+    divergence_reports = analyze_divergence_many(db, analysed_symbols) if analysis else {}
+    behavior_contexts = mine_investor_behavior_many(db, analysed_symbols) if analysis else {}
+
+    for token, price, recent_prices in analysis:
+        print(f"🧠 Lucy Brain: Triggering analysis for {token.symbol}...")
+        behavior_context = behavior_contexts[token.symbol]
+        if (behavior_context == "No recent whale activity detected (Insufficient Data)"):
+            print(f"🧠 Lucy Brain: {behavior_context}")
+        
+        sentiment, confidence, insight = get_market_prediction(
+            db, recent_prices, token.symbol, behavior_context, divergence_reports[token.symbol]
+        )
+        save_prediction_to_db(token.symbol, sentiment, confidence, price, db)
         
+        # Inside your 5-minute brain loop in tasks.py
+        insight_payload = {
+            "type": "insight_update",
+            "symbol": token.symbol,
+            "probability": float(confidence), # e.g., 0.92
+            "prediction_type": sentiment, # e.g., "Bullish"
+            "insight_text": format_lucy_log(token.symbol, float(confidence), insight)
+        }
+        await ws_manager.publish(insight_payload)
+        analysis_cooldowns[token.symbol] = current_time
+
+    if stale_ids:
+        deleted = db.query(TokenMap).filter(TokenMap.pyth_id.in_(stale_ids)).delete(synchronize_session=False)
+        if deleted:
+            db.commit()
+            price_cache.drop(token.symbol for token, price in updates if price == "STALE")
+            token_catalog.invalidate()
+            await ws_manager.publish_tickers(ticker_board.refresh(price_cache.tickers()))
+            print(f"🧹 Removed {deleted} stale feeds from TokenMap.")
+
 async def continuous_oracle_sync(ws_manager):
-    global last_stats_update
     print("SYNC RUNNING...")
     try:
         with SessionLocal() as db:
             active_tokens = db.query(TokenMap).filter(TokenMap.is_active == True).all()
 
-            tasks = [fetch_pyth_price_safe(t.pyth_id) for t in active_tokens]
-            prices = await asyncio.gather(*tasks)
+            # One Hermes request per chunk of feeds instead of one per token
+            prices_by_id = await fetch_pyth_prices([t.pyth_id for t in active_tokens])
+            updates = [(t, prices_by_id.get(t.pyth_id)) for t in active_tokens]
+
+            await process_price_updates(db, ws_manager, updates)
 
-            for token, price in zip(active_tokens, prices):
-                if price and price != "STALE":
-                    db_save_price(token.symbol, price, datetime.now(), db)
-                    whale_data = await fetch_dex_whales(token.address) # 👈 Using your new column!
-    
-                    if whale_data:
-                        data = map_to_investor_behavior(token.symbol, whale_data['type'], whale_data['amount'])
-                    else:
-                        # Fallback to Ghost Whale logic if DEX data is missing
-                        history = db.query(Stock).filter(Stock.symbol == token.symbol).limit(2).all()
-                        inferred = infer_whale_activity(history)
-                        data = map_to_investor_behavior(token.symbol, inferred, 500.0)
-
-                    # 3. Save both to DB
-                    db_save_behavior(data, db)
-                    
-                    print(f"✅ Synced {token.symbol}: ${price:.4f} | Movement: {data['flow_type']}")
-                    
-                    last_run = analysis_cooldowns.get(token.symbol, 0)
-                    current_time = time.time()
-
-                    if (current_time - last_stats_update) > 600: # Update reliability every 10 mins
-                        win_rate, total_trades, streak = get_agent_stats(db, token.symbol)
-                        
-                        stats_payload = {
-                            "type": "agent_stats",
-                            "symbol": token.symbol,
-                            "win_rate": round(win_rate, 2),
-                            "total_trades": total_trades,
-                            "streak": streak
-                        }
-                        await ws_manager.broadcast(json.dumps(stats_payload))
-                        last_stats_update = current_time
-
-                    if (current_time - last_run) > 300:
-                        recent_prices = get_recent_prices(token.symbol, db, limit=100)
-                        
-                        # Check if we hit the threshold
-                        if len(recent_prices) >= 10:
-                            print(f"🧠 Lucy Brain: Triggering analysis for {token.symbol}...")
-                            behavior_context = mine_investor_behavior(db, token.symbol)
-                            if (behavior_context == "No recent whale activity detected (Insufficient Data)"):
-                                print(f"🧠 Lucy Brain: {behavior_context}")
-                            
-                            sentiment, confidence, insight = get_market_prediction(db, recent_prices, token.symbol, behavior_context)
-                            save_prediction_to_db(token.symbol, sentiment, confidence, price, db)
-                            
-                            # Inside your 5-minute brain loop in tasks.py
-                            insight_payload = {
-                                "type": "insight_update",
-                                "symbol": token.symbol,
-                                "probability": float(confidence), # e.g., 0.92
-                                "prediction_type": sentiment, # e.g., "Bullish"
-                                "insight_text": format_lucy_log(token.symbol, float(confidence), insight)
-                            }
-                            await ws_manager.broadcast(json.dumps(insight_payload))
-                            analysis_cooldowns[token.symbol] = current_time
-                elif price == "STALE":
-                    deleted = db.query(TokenMap).filter(TokenMap.pyth_id == token.pyth_id).delete()
-                    if deleted:
-                        db.commit()
-                    
     except asyncio.CancelledError:
         print("🔌 Reloading...")
         raise
     except Exception as e:
         print(f"🚨 Error: {e}")
 
+JUDGE_CHUNK_SIZE = 1000  # Predictions per bulk UPDATE
+JUDGE_WINDOWS_PER_QUERY = 500  # (symbol, window) predicates OR-ed into one query
+# Pending predictions older than this are closed without a verdict instead of being graded
+JUDGE_LOOKBACK = timedelta(hours=float(os.getenv("LUCY_JUDGE_LOOKBACK_HOURS", 168)))
+
+def _merge_windows(windows: list):
+    """Sorted, non-overlapping (start, end) pairs covering `windows`."""
+    merged = []
+    for start, end in sorted(windows):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+def _tick_series(db, windows_by_symbol: dict):
+    """
+    {symbol: (sorted epoch seconds, prices)} holding only the ticks inside each symbol's
+    (start, end) windows, so a backlog spread over days never reads the days in between.
+    Every symbol's windows go into the same OR-ed query, chunked by total window count.
+    """
+    windows = [(symbol, start, end) for symbol, ws in windows_by_symbol.items() for start, end in _merge_windows(ws)]
+    grouped = {symbol: ([], []) for symbol in windows_by_symbol}
+    for i in range(0, len(windows), JUDGE_WINDOWS_PER_QUERY):
+        rows = db.execute(
+            select(Stock.symbol, Stock.datetime, Stock.price)
+            .where(or_(*(
+                and_(Stock.symbol == symbol, Stock.datetime.between(start, end))
+                for symbol, start, end in windows[i:i + JUDGE_WINDOWS_PER_QUERY]
+            )))
+            .order_by(Stock.symbol, Stock.datetime.asc())
+        ).all()
+        for symbol, dt, price in rows:
+            grouped[symbol][0].append(dt)
+            grouped[symbol][1].append(price)
+
+    # Chunks can split one symbol's windows; each chunk is in time order, so merge per symbol
+    series = {}
+    for symbol, (dts, prices) in grouped.items():
+        times = to_epoch_seconds(dts)
+        order = np.argsort(times, kind="stable")
+        series[symbol] = (times[order], np.array(prices, dtype=np.float64)[order])
+    return series
+
 async def evaluate_predictions_task(ws_manager):
-    """The Judge: Compares old predictions with current prices."""
-    while True:
-        with SessionLocal() as db:
-            # Look for unresolved predictions older than 1 hour
-            one_hour_ago = datetime.now() - timedelta(hours=1)
-            pending = db.query(PredictionLog).filter(
-                PredictionLog.was_correct == None,
-                PredictionLog.timestamp <= one_hour_ago
-            ).all()
-
-            for p in pending:
-                # 2. Get the 'Current' price from our history
-                current_price_row = db.query(Stock).filter(Stock.symbol == p.symbol).order_by(Stock.datetime.desc()).first()
-                
-                if current_price_row:
-                    actual_price = current_price_row.price
-            
-                    # 2. Logic: Did the price go up or down?
-                    # Note: Standardize your strings (e.g., all uppercase) to avoid "Bullish" vs "BULLISH" bugs
-                    actual_move = "BULLISH" if actual_price > p.price_at_prediction else "BEARISH"
-                    predicted = p.predicted_sentiment.upper()
-                    
-                    # 3. Save the Verdict to the Object
-                    p.actual_price_later = actual_price
-                    p.was_correct = (predicted == actual_move)
-                    p.was_evaluated = True  # Crucial: This moves it out of the 'pending' queue
-                    
-                    # 4. Finalize
-                    win_rate, total, streak = get_agent_stats(db, p.symbol)
-    
-                    status_msg = f"⚖️ Verdict: Lucy was {'✅ RIGHT' if p.was_correct else '❌ WRONG'} on {p.symbol}!"
-                    
-                    payload = {
-                        "type": "agent_stats",
-                        "symbol": p.symbol,
-                        "win_rate": win_rate,
-                        "total_trades": total,
-                        "content": status_msg, # This goes to the ThoughtStream
-                        "streak": streak
-                    }
-
-                    # 2. BROADCAST IMMEDIATELY inside the loop
-                    await ws_manager.broadcast(json.dumps(payload))
-                    
-                    # 3. STAGGER (The Secret)
-                    # This gives the WebSocket 10ms to send the packet before the next one
-                    await asyncio.sleep(0.01)
+    """
+    The Judge: grades each prediction against the price at exactly timestamp + horizon,
+    via a vectorized as-of join over each symbol's sorted ticks.
+    """
+    started = time.perf_counter()
+    verdicts_by_symbol = defaultdict(list)
 
+    with SessionLocal() as db:
+        # Anything left pending past the lookback can no longer be graded cheaply; close it
+        now = datetime.now()
+        abandoned = db.execute(
+            update(PredictionLog)
+            .where(PredictionLog.was_evaluated == False, PredictionLog.timestamp < now - JUDGE_LOOKBACK)
+            .values(was_evaluated=True, was_correct=None)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if abandoned:
             db.commit()
-        await asyncio.sleep(3600) # Run every hour
+            print(f"⚖️ Judge: closed {abandoned} predictions older than the {JUDGE_LOOKBACK} lookback.")
+
+        # Look for unresolved predictions whose shortest possible horizon has passed
+        pending = db.execute(
+            select(PredictionLog.id, PredictionLog.symbol, PredictionLog.predicted_sentiment,
+                   PredictionLog.price_at_prediction, PredictionLog.timestamp, PredictionLog.horizon_minutes)
+            .where(PredictionLog.was_evaluated == False,
+                   PredictionLog.timestamp >= now - JUDGE_LOOKBACK,
+                   PredictionLog.timestamp <= now - timedelta(minutes=min(HORIZONS.values())))
+            .order_by(PredictionLog.timestamp.asc())
+        ).all()
+        due = [p for p in pending if p.timestamp + timedelta(minutes=p.horizon_minutes or DEFAULT_HORIZON) <= now]
+        if not due:
+            return {"verdicts": 0, "symbols": 0, "seconds": 0.0, "verdicts_per_second": 0.0}
+
+        # 1. Only the ticks the as-of join can land on: [target - tolerance, target] per prediction
+        windows = defaultdict(list)
+        for p in due:
+            target = p.timestamp + timedelta(minutes=p.horizon_minutes or DEFAULT_HORIZON)
+            windows[p.symbol].append((target - timedelta(seconds=ASOF_TOLERANCE), target))
+        series = _tick_series(db, windows)
+
+        # 2. As-of prices for all horizons in one pass per symbol, then each prediction's own column
+        horizons = np.array(sorted({p.horizon_minutes or DEFAULT_HORIZON for p in due}), dtype=np.int64) * 60
+        by_symbol = defaultdict(list)
+        for p in due:
+            by_symbol[p.symbol].append(p)
+
+        actual_by_id, correct_by_id = {}, {}
+        now_ts = to_epoch_seconds([now])[0]
+        for symbol, preds in by_symbol.items():
+            empty = np.array([], dtype=np.int64)
+            tick_times, tick_prices = series.get(symbol, (empty, empty))
+            pred_times = to_epoch_seconds([p.timestamp for p in preds])
+            own = np.searchsorted(horizons, [(p.horizon_minutes or DEFAULT_HORIZON) * 60 for p in preds])
+
+            matrix = asof_prices(tick_times, tick_prices, pred_times, horizons)
+            actual = matrix[np.arange(len(preds)), own]
+            expired = (now_ts - (pred_times + horizons[own])) > ASOF_EXPIRY
+
+            for p, actual_price, is_expired in zip(preds, actual.tolist(), expired.tolist()):
+                if math.isnan(actual_price):
+                    if is_expired:
+                        # No tick near the horizon ever arrived; close it without a verdict
+                        actual_by_id[p.id], correct_by_id[p.id] = None, None
+                    continue
+
+                # Did the price go up or down?
+                # Note: Standardize your strings (e.g., all uppercase) to avoid "Bullish" vs "BULLISH" bugs
+                actual_move = "BULLISH" if actual_price > p.price_at_prediction else "BEARISH"
+                was_correct = (p.predicted_sentiment.upper() == actual_move)
+
+                actual_by_id[p.id] = actual_price
+                correct_by_id[p.id] = was_correct
+                verdicts_by_symbol[symbol].append(was_correct)
+
+        # 3. Save every Verdict with one UPDATE ... CASE per chunk, plus the scoreboards
+        ids = list(actual_by_id)
+        for i in range(0, len(ids), JUDGE_CHUNK_SIZE):
+            chunk = ids[i:i + JUDGE_CHUNK_SIZE]
+            db.execute(
+                update(PredictionLog)
+                .where(PredictionLog.id.in_(chunk))
+                .values(
+                    actual_price_later=case({pid: actual_by_id[pid] for pid in chunk}, value=PredictionLog.id),
+                    was_correct=case({pid: correct_by_id[pid] for pid in chunk}, value=PredictionLog.id),
+                    was_evaluated=True  # Crucial: This moves it out of the 'pending' queue
+                )
+                .execution_options(synchronize_session=False)
+            )
+        for symbol, verdicts in verdicts_by_symbol.items():
+            scoreboard.record_verdicts(db, symbol, verdicts)
+        db.commit()
+
+        elapsed = time.perf_counter() - started
+        judged = sum(len(v) for v in verdicts_by_symbol.values())
+        rate = judged / elapsed if elapsed > 0 else float(judged)
+        print(f"⚖️ Judge: {judged} verdicts across {len(verdicts_by_symbol)} symbols in {elapsed:.3f}s ({rate:,.0f}/s), "
+              f"{len(ids) - judged} expired without a horizon price.")
+        # 4. Finalize: one stats broadcast per symbol
+        for symbol, verdicts in verdicts_by_symbol.items():
+            win_rate, total, streak = get_agent_stats(db, symbol)
+
+            if len(verdicts) == 1:
+                status_msg = f"⚖️ Verdict: Lucy was {'✅ RIGHT' if verdicts[0] else '❌ WRONG'} on {symbol}!"
+            else:
+                status_msg = f"⚖️ Verdicts: Lucy was ✅ RIGHT on {sum(verdicts)}/{len(verdicts)} {symbol} calls!"
+
+            payload = {
+                "type": "agent_stats",
+                "symbol": symbol,
+                "win_rate": win_rate,
+                "total_trades": total,
+                "content": status_msg, # This goes to the ThoughtStream
+                "streak": streak
+            }
+            await ws_manager.publish(payload)
+
+    return {"verdicts": judged, "symbols": len(verdicts_by_symbol), "seconds": round(elapsed, 3), "verdicts_per_second": round(rate, 1)}
 
 async def backfill_history_task(symbol: str, start_dt: datetime):
     """Refactored backfiller: Uses TokenMap to find the correct Pyth ID."""
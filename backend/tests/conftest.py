@@ -0,0 +1,9 @@
+import os
+import sys
+
+# Backend modules import each other as top-level modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# database.py builds its engines at import time; nothing here connects to them
+for key, value in {"DB_USER": "lucy", "DB_PASS": "lucy", "DB_HOST": "127.0.0.1", "DB_PORT": "3306", "DB_NAME": "lucy"}.items():
+    os.environ.setdefault(key, value)
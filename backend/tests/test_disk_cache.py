@@ -0,0 +1,56 @@
+import asyncio
+import json
+import pytest
+import disk_cache
+import utils
+
+PYTH_FEEDS = [{"id": "aa" * 32, "attributes": {"base": "BTC"}}]
+COINGECKO_LIST = [
+    {"id": "bitcoin", "symbol": "btc", "name": "Bitcoin", "platforms": {"ethereum": "0xbtc"}},
+    {"id": "dogecoin", "symbol": "doge", "name": "Dogecoin", "platforms": {}},
+]
+
+def _write(path, text: str):
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+def test_iter_json_array_streams_elements(tmp_path):
+    path = _write(tmp_path / "list.json", " \n" + json.dumps(COINGECKO_LIST))
+    assert list(disk_cache.iter_json_array(path, chunk_size=16)) == COINGECKO_LIST
+
+@pytest.mark.parametrize("text", [json.dumps(COINGECKO_LIST)[:-20], '{"not": "an array"}', ""])
+def test_iter_json_array_rejects_truncated_or_non_array(tmp_path, text):
+    path = _write(tmp_path / "list.json", text)
+    with pytest.raises(disk_cache.CorruptCacheFile) as info:
+        list(disk_cache.iter_json_array(path, chunk_size=16))
+    assert info.value.path == path
+
+def _serve_mirrors(monkeypatch, tmp_path, coingecko_bodies: list):
+    """Stands in for cached_download: each (re)download of the CoinGecko list writes the next body."""
+    downloads = []
+    monkeypatch.setattr(utils, "_token_list_memo", (None, None))
+
+    async def fake_download(url, name, max_age, timeout=60.0):
+        path = tmp_path / name
+        if not path.exists():
+            downloads.append(name)
+            _write(path, json.dumps(PYTH_FEEDS) if url == utils.PYTH_FEEDS_URL else coingecko_bodies.pop(0))
+        return str(path)
+
+    monkeypatch.setattr(utils, "cached_download", fake_download)
+    return downloads
+
+def test_get_tokens_refetches_a_truncated_mirror(monkeypatch, tmp_path):
+    downloads = _serve_mirrors(monkeypatch, tmp_path, [json.dumps(COINGECKO_LIST)[:-20], json.dumps(COINGECKO_LIST)])
+
+    tokens = asyncio.run(utils.get_tokens())
+
+    assert downloads.count("coingecko_coins_list.json") == 2
+    assert tokens == [{"symbol": "BTC", "coingecko_id": "bitcoin", "name": "Bitcoin", "pyth_id": "aa" * 32, "address": "0xbtc"}]
+
+def test_get_tokens_returns_none_when_the_refetch_is_corrupt_too(monkeypatch, tmp_path):
+    truncated = json.dumps(COINGECKO_LIST)[:-20]
+    _serve_mirrors(monkeypatch, tmp_path, [truncated, truncated])
+
+    assert asyncio.run(utils.get_tokens()) is None
+    assert not (tmp_path / "coingecko_coins_list.json").exists() # Not left behind for the next caller
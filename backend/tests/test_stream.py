@@ -0,0 +1,115 @@
+import asyncio
+import json
+import time
+from contextlib import nullcontext
+from types import SimpleNamespace
+import stream
+from http_pool import http_pool
+
+BTC_ID = "0x" + "aa" * 32
+ETH_ID = "0x" + "bb" * 32
+
+def _event(feed_id: str, price: int):
+    feed = {"id": feed_id[2:], "price": {"price": str(price), "expo": 0, "publish_time": int(time.time())}}
+    return f"data: {json.dumps({'parsed': [feed]})}\n\n".encode()
+
+class FakeHermes:
+    """
+    Serves one scripted burst of SSE events per connection and hangs up, except on the last
+    connection, which stays open like the real stream. Reconnections wait for `resume`.
+    """
+    def __init__(self, bursts: list):
+        self.bursts = bursts
+        self.resume = asyncio.Event()
+        self.requests = []
+        self.writers = []
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        return f"http://127.0.0.1:{self.server.sockets[0].getsockname()[1]}"
+
+    async def stop(self):
+        self.server.close()
+        for writer in self.writers:
+            writer.close()
+        await self.server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        request = await reader.readuntil(b"\r\n\r\n")
+        self.requests.append(request.split(b"\r\n", 1)[0].decode())
+        self.writers.append(writer)
+        burst = self.bursts[min(len(self.requests), len(self.bursts)) - 1]
+        if len(self.requests) > 1:
+            await self.resume.wait()
+
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nConnection: close\r\n\r\n")
+        for chunk in burst:
+            writer.write(chunk)
+            await writer.drain()
+        if len(self.requests) < len(self.bursts):
+            writer.close()
+        else:
+            await reader.read() # Until the client goes away
+
+async def _wait_for(condition, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+def test_stream_coalesces_ticks_and_reconnects(monkeypatch):
+    broadcasts, saves = [], []
+
+    async def fake_broadcast(ws_manager, ticks):
+        broadcasts.append({symbol: price for symbol, price, _ in ticks})
+
+    async def fake_process(db, ws_manager, updates, behavior_interval=0, broadcast=True):
+        saves.append(({token.symbol: price for token, price in updates}, broadcast))
+
+    tokens = {
+        stream.normalize_feed_id(BTC_ID): SimpleNamespace(symbol="BTC", pyth_id=BTC_ID),
+        stream.normalize_feed_id(ETH_ID): SimpleNamespace(symbol="ETH", pyth_id=ETH_ID),
+    }
+    monkeypatch.setattr(stream, "broadcast_price_ticks", fake_broadcast)
+    monkeypatch.setattr(stream, "process_price_updates", fake_process)
+    monkeypatch.setattr(stream, "SessionLocal", nullcontext)
+    monkeypatch.setattr(stream.HermesStreamEngine, "_load_tokens", lambda self: tokens)
+
+    async def scenario():
+        hermes = FakeHermes([
+            [_event(BTC_ID, 1), _event(BTC_ID, 2), _event(ETH_ID, 10), _event(BTC_ID, 3)],
+            [_event(BTC_ID, 4)],
+        ])
+        monkeypatch.setenv("HERMES_STREAM_URL", await hermes.start())
+        # Loops are slowed right down so the test drives flush() and save() itself
+        engine = stream.HermesStreamEngine(None, flush_interval=3600, db_interval=3600, reconnect_delay=0.01)
+        await engine.start()
+        try:
+            await _wait_for(lambda: engine.stats["events"] >= 4)
+            await engine.flush()
+            assert broadcasts == [{"BTC": 3.0, "ETH": 10.0}] # One tick per symbol, the latest one
+            assert saves == [] # Broadcasting never writes to the DB
+
+            await engine.save()
+            assert saves == [({"BTC": 3.0, "ETH": 10.0}, False)]
+
+            # The server hung up after the first burst; the engine comes back for the rest
+            hermes.resume.set()
+            await _wait_for(lambda: engine.stats["events"] >= 5)
+            assert len(hermes.requests) == 2
+            assert all(r.startswith(f"GET {stream.STREAM_PATH}?") for r in hermes.requests)
+
+            await engine.flush()
+            await engine.save()
+            assert broadcasts[-1] == {"BTC": 4.0}
+            assert saves[-1] == ({"BTC": 4.0}, False)
+            assert engine.stats["flushes"] == 2 and engine.stats["saves"] == 2
+        finally:
+            for task in engine._tasks:
+                task.cancel()
+            await asyncio.gather(*engine._tasks, return_exceptions=True)
+            await hermes.stop()
+            await http_pool.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,29 @@
+import pytest
+import utils
+from symbol_matcher import SymbolMatcher
+
+SYMBOLS = ["BTC", "ETH", "NEAR", "FLOW"]
+NAMES = {"near": "NEAR", "flow": "FLOW", "bitcoin": "BTC"}
+
+@pytest.fixture
+def matcher(monkeypatch):
+    matcher = SymbolMatcher()
+    matcher.refresh(SYMBOLS, NAMES)
+    monkeypatch.setattr(utils, "symbol_matcher", matcher)
+    monkeypatch.setattr(utils, "user_sessions", {})
+    return matcher
+
+def test_alias_outranks_earlier_plain_word_name(matcher):
+    assert utils.extract_symbol("price near 100k for bitcoin", "s") == "BTC"
+
+def test_ticker_outranks_earlier_name(matcher):
+    assert utils.extract_symbol("will the flow of money lift ETH", "s") == "ETH"
+
+def test_capitalised_ticker_still_matches(matcher):
+    assert utils.extract_symbol("is NEAR a buy", "s") == "NEAR"
+
+def test_name_used_when_nothing_stronger(matcher):
+    assert utils.extract_symbol("how is near protocol doing", "s") == "NEAR"
+
+def test_aliases_register_once_with_alias_kind(matcher):
+    assert matcher.find("bitcoin") == [(0, "alias", "BTC")]
@@ -0,0 +1,145 @@
+import asyncio
+import base64
+import json
+import os
+import time
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from sqlalchemy import select
+from database import AsyncSessionLocal
+from models import TokenMap
+from symbol_matcher import symbol_matcher
+from utils import get_tokens
+
+CATALOG_TTL = float(os.getenv("LUCY_CATALOG_TTL_SECONDS", 600))
+
+CatalogEntry = namedtuple("CatalogEntry", ["symbol", "coingecko_id", "pyth_id", "address", "has_pro_feed", "is_active"])
+
+def _key(entry: CatalogEntry):
+    return (entry.symbol, entry.coingecko_id or "", entry.address or "")
+
+def encode_cursor(key: tuple):
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str):
+    """The sort key a page ended on. Raises ValueError for anything this module didn't hand out."""
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    if not (isinstance(key, list) and len(key) == 3 and all(isinstance(part, str) for part in key)):
+        raise ValueError("Invalid cursor")
+    return tuple(key)
+
+class TokenCatalog:
+    """
+    The /web3-list catalogue: discovery tokens joined with TokenMap once, sorted by symbol.
+    Pages are bisected out of the sorted keys, so prefix search and cursor pagination cost
+    O(log n + page) however large the catalogue is. Cursors are sort keys, not offsets, so
+    they stay valid across rebuilds.
+    """
+    def __init__(self):
+        self.entries: list[CatalogEntry] = []
+        self.views = {}      # (has_pro_feed, is_active) -> (entries, keys)
+        self.built_at = 0.0
+        self.stale = True
+        self._rebuild: asyncio.Task = None
+
+    def build(self, tokens: list, mappings: list):
+        by_symbol = {m.symbol: m for m in mappings}
+        unique = {}
+        for token in tokens:
+            mapping = by_symbol.get(token["symbol"])
+            active = bool(mapping and mapping.is_active)
+            entry = CatalogEntry(
+                symbol=token["symbol"],
+                coingecko_id=token.get("coingecko_id"),
+                pyth_id=mapping.pyth_id if active else None,
+                address=token.get("address"),
+                has_pro_feed=active and mapping.pyth_id is not None,
+                is_active=active
+            )
+            unique[_key(entry)] = entry # Pyth lists some bases more than once
+
+        entries = [unique[key] for key in sorted(unique)]
+        # Swapped in with single assignments; filtered views are rebuilt lazily
+        self.views = {(None, None): (entries, [_key(e) for e in entries])}
+        self.entries = entries
+        self.built_at = time.monotonic()
+        self.stale = False
+
+    def invalidate(self):
+        """Called when TokenMap changes; rebuilds in the background from the cached discovery lists."""
+        self.stale = True
+        self._schedule()
+
+    def refresh(self):
+        """Starts a background rebuild (startup, TokenMap changes)."""
+        return self._schedule()
+
+    async def keep_fresh(self):
+        """Per-worker loop: rebuilds the catalogue and the chat symbol matcher every CATALOG_TTL."""
+        while True:
+            try:
+                await asyncio.shield(self._schedule())
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️ Catalog: rebuild failed ({type(e).__name__}: {e}), keeping the current one.")
+            await asyncio.sleep(CATALOG_TTL)
+
+    def _view(self, has_pro_feed: bool = None, is_active: bool = None):
+        view = self.views.get((has_pro_feed, is_active))
+        if view is None:
+            entries = [
+                e for e in self.entries
+                if (has_pro_feed is None or e.has_pro_feed == has_pro_feed)
+                and (is_active is None or e.is_active == is_active)
+            ]
+            view = (entries, [_key(e) for e in entries])
+            self.views[(has_pro_feed, is_active)] = view
+        return view
+
+    def page(self, prefix: str = "", cursor: str = None, limit: int = 50,
+             has_pro_feed: bool = None, is_active: bool = None):
+        entries, keys = self._view(has_pro_feed, is_active)
+        prefix = prefix.upper()
+        lo = bisect_left(keys, (prefix,))
+        hi = bisect_left(keys, (prefix + "\uffff",)) if prefix else len(keys)
+
+        start = max(lo, bisect_right(keys, decode_cursor(cursor))) if cursor else lo
+        end = min(start + limit, hi)
+        return {
+            "items": [e._asdict() for e in entries[start:end]],
+            "next_cursor": encode_cursor(keys[end - 1]) if end < hi else None,
+            "total": hi - lo
+        }
+
+    async def ensure(self):
+        """Builds on first use; afterwards a stale or expired catalogue is rebuilt in the background."""
+        if not self.built_at:
+            await asyncio.shield(self._schedule())
+        elif self.stale or (time.monotonic() - self.built_at) > CATALOG_TTL:
+            self._schedule()
+
+    def _schedule(self):
+        if self._rebuild is None or self._rebuild.done():
+            self._rebuild = asyncio.create_task(self._run())
+        return self._rebuild
+
+    async def _run(self):
+        tokens = await get_tokens()
+        async with AsyncSessionLocal() as db:
+            mappings = (await db.execute(select(TokenMap))).scalars().all()
+
+        # The chat symbol matcher follows TokenMap even when discovery is down, with the last good names
+        names = None if tokens is None else {t["name"].lower(): t["symbol"] for t in tokens if t.get("name")}
+        symbol_matcher.refresh([m.symbol for m in mappings], names)
+        if tokens is None:
+            print(f"⚠️ Catalog: discovery lists unavailable, keeping the current catalogue ({symbol_matcher.size} chat patterns).")
+            return
+
+        self.build(tokens, mappings)
+        print(f"📚 Catalog: indexed {len(self.entries)} tokens, {symbol_matcher.size} chat patterns.")
+
+token_catalog = TokenCatalog()
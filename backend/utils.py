@@ -1,19 +1,15 @@
 import asyncio
-import requests
+import os
 import time
 import httpx
-import re
-from sqlalchemy import func
+from sqlalchemy import func, select
 from datetime import datetime, timedelta
-from models import InvestorBehavior, TokenMap
+from models import InvestorBehavior
+from http_pool import http_pool
+from disk_cache import CorruptCacheFile, cached_download, discard, iter_json_array, load_json
+from symbol_matcher import KIND_RANK, symbol_matcher
 
 user_sessions = {}
-http_client: httpx.AsyncClient = None  # Global client initialized in lifespan
-async def get_client():
-    global http_client
-    if http_client is None or http_client.is_closed:
-        http_client = httpx.AsyncClient(timeout=10.0)
-    return http_client
 
 # utils.py
 class Colors:
@@ -40,62 +36,85 @@ def format_lucy_log(symbol, confidence, insight):
 
     return f"{prefix} {symbol.ljust(8)} @ {int(confidence*100)}% : {insight}"
 
+PYTH_FEEDS_URL = "https://hermes.pyth.network/v2/price_feeds?asset_type=crypto"
+COINGECKO_LIST_URL = "https://api.coingecko.com/api/v3/coins/list?include_platform=true"
+TOKEN_LIST_MAX_AGE = float(os.getenv("LUCY_TOKEN_LIST_MAX_AGE", 6 * 3600))
+_token_list_memo = (None, None) # ((pyth mtime, coingecko mtime), token_list)
+
+def _match_token_lists(pyth_path: str, cg_path: str):
+    pyth_feeds = load_json(pyth_path)
+    wanted = {feed.get("attributes", {}).get("base", "").upper() for feed in pyth_feeds}
+
+    # Stream CoinGecko's catalogue and keep only the symbols Pyth lists (uppercase)
+    cg_lookup = {}
+    for item in iter_json_array(cg_path):
+        symbol = item.get('symbol', '').upper()
+        if symbol in wanted:
+            cg_lookup[symbol] = item
+
+    token_list = []
+    for feed in pyth_feeds:
+        attr = feed.get("attributes", {})
+        symbol = attr.get("base", "").upper()
+        
+        # Match with CoinGecko
+        cg_data = cg_lookup.get(symbol)
+        
+        # Extract the first available contract address
+        address = None
+        if cg_data and cg_data.get('platforms'):
+            # We prioritize Ethereum or Solana, or just take the first one
+            platforms = cg_data['platforms']
+            address = next(iter(platforms.values())) if platforms else None
+
+            token_list.append({
+                "symbol": symbol,
+                "coingecko_id": cg_data['id'] if cg_data else f"pyth-auto-{symbol.lower()}",
+                "name": cg_data.get('name'),
+                "pyth_id": feed["id"],
+                "address": address
+            })
+
+    return token_list
+
 async def get_tokens():
     """
     1. Fetches all Pyth feeds.
     2. Fetches CoinGecko's ID map (including addresses).
     3. Matches them to create a perfect TokenMap entry.
+    Both lists are mirrored on disk and revalidated conditionally; the match is redone only when one changed.
+    A corrupt mirror is discarded and fetched again once. Returns None when the lists are unavailable.
     """
-    # 1. Get Pyth Feeds (Your existing logic)
-    pyth_url = "https://hermes.pyth.network/v2/price_feeds?asset_type=crypto"
-    # 2. Get CoinGecko ID Map with Addresses
-    cg_url = "https://api.coingecko.com/api/v3/coins/list?include_platform=true"
-
-    async with httpx.AsyncClient() as client:
-        pyth_res, cg_res = await asyncio.gather(
-            client.get(pyth_url),
-            client.get(cg_url)
+    global _token_list_memo
+    for attempt in range(2):
+        pyth_path, cg_path = await asyncio.gather(
+            cached_download(PYTH_FEEDS_URL, "pyth_price_feeds.json", TOKEN_LIST_MAX_AGE),
+            cached_download(COINGECKO_LIST_URL, "coingecko_coins_list.json", TOKEN_LIST_MAX_AGE)
         )
-
-        if pyth_res.status_code != 200 or cg_res.status_code != 200:
+        if not pyth_path or not cg_path:
             return None
 
-        pyth_feeds = pyth_res.json()
-        cg_map = cg_res.json() # List of {id, symbol, platforms: {chain: address}}
+        key = (os.path.getmtime(pyth_path), os.path.getmtime(cg_path))
+        if _token_list_memo[0] == key:
+            break
+        try:
+            # Parsing tens of MB is CPU work; keep it off the event loop
+            _token_list_memo = (key, await asyncio.to_thread(_match_token_lists, pyth_path, cg_path))
+            break
+        except CorruptCacheFile as e:
+            print(f"⚠️ Token lists: {e}, {'refetching' if attempt == 0 else 'giving up'}.")
+            discard(e.path)
+    else:
+        return None
 
-        # Create a lookup for CG by symbol (uppercase)
-        cg_lookup = {item['symbol'].upper(): item for item in cg_map}
+    return [dict(token) for token in _token_list_memo[1]]
 
-        token_list = []
-        for feed in pyth_feeds:
-            attr = feed.get("attributes", {})
-            symbol = attr.get("base", "").upper()
-            
-            # Match with CoinGecko
-            cg_data = cg_lookup.get(symbol)
-            
-            # Extract the first available contract address
-            address = None
-            if cg_data and cg_data.get('platforms'):
-                # We prioritize Ethereum or Solana, or just take the first one
-                platforms = cg_data['platforms']
-                address = next(iter(platforms.values())) if platforms else None
-
-                token_list.append({
-                    "symbol": symbol,
-                    "coingecko_id": cg_data['id'] if cg_data else f"pyth-auto-{symbol.lower()}",
-                    "pyth_id": feed["id"],
-                    "address": address
-                })
-
-        return token_list
-
-def get_fear_and_greed():
-    """Fetches current crypto market sentiment."""
+async def fetch_fear_and_greed():
+    """Fetches current crypto market sentiment. None when the upstream fails, so caches keep their last value."""
     try:
         url = "https://api.alternative.me/fng/"
-        response = requests.get(url).json()
-        data = response['data'][0]
+        response = await http_pool.get(url)
+        data = response.json()['data'][0]
         
         return {
             "value": data['value'],
@@ -104,10 +123,10 @@ def get_fear_and_greed():
         }
     except Exception as e:
         print(f"Sentiment Error: {e}")
-        return {"value": "50", "sentiment": "Neutral"}
+        return None
         
-def get_global_movers():
-    """Fetches top 3 gainers and losers from CoinGecko."""
+async def fetch_global_movers():
+    """Fetches top 3 gainers from CoinGecko. None when the upstream fails."""
     try:
         # Free Demo API endpoint for market data
         url = "https://api.coingecko.com/api/v3/coins/markets"
@@ -117,45 +136,72 @@ def get_global_movers():
             "per_page": 5,
             "page": 1
         }
-        data = requests.get(url, params=params).json()
+        response = await http_pool.get(url, params=params)
+        data = response.json()
         
         gainers = [f"{c['symbol'].upper()} (+{round(c['price_change_percentage_24h'], 1)}%)" for c in data[:3]]
         return {"top_gainers": gainers}
     except Exception as e:
-        return {"top_gainers": []}
+        print(f"Movers Error: {e}")
+        return None
     
-def extract_symbol(db, text: str, session_id: str = "default_user"):
+def extract_symbols(text: str):
+    """Every token the text mentions, by ticker or by name, in reading order and without repeats."""
+    return list(dict.fromkeys(symbol for _, _, symbol in symbol_matcher.find(text)))
+
+def extract_symbol(text: str, session_id: str = "default_user"):
     """
     Scans text for crypto symbols. 
-    Priority: 1. Uppercase symbols (BTC) 2. Known lowercase keywords.
+    Priority, wherever each appears: 1. Uppercase symbols (BTC) 2. Aliases (bitcoin)
+    3. Token names (Solana), so a name that is also a plain word ("near") never wins over a real mention.
     """
-    # Look for 3-5 consecutive uppercase letters (e.g., "Tell me about SOL")
-    found = re.findall(r'\b[A-Z]{3,5}\b', text)
-    if found:
-        symbol_obj = db.query(TokenMap).filter(TokenMap.symbol == found[0]).first()
-        if symbol_obj:
-            user_sessions[session_id] = symbol_obj.symbol
-            return symbol_obj.symbol
-
-    # Fallback: check for common lowercase mentions
-    text_lower = text.lower()
-    common_map = {"bitcoin": "BTC", "ethereum": "ETH", "solana": "SOL", "doge": "DOGE"}
-    for name, sym in common_map.items():
-        if name in text_lower:
-            return sym
+    matches = symbol_matcher.find(text)
+    if matches:
+        _, _, symbol = min(matches, key=lambda match: KIND_RANK[match[1]])
+        user_sessions[session_id] = symbol
+        return symbol
     
     return user_sessions.get(session_id, "BTC")  # Default to BTC if nothing is found
 
 
+HERMES_URL = "https://hermes.pyth.network"
+PYTH_BATCH_SIZE = 50        # ids[] per Hermes request (keeps the query string well under URL limits)
+PYTH_STALE_SECONDS = 86400  # Feeds that haven't published in 24h are flagged for deletion
+pyth_gate = asyncio.Semaphore(4)
+
+def normalize_feed_id(price_id: str):
+    # Hermes answers with bare hex ids, TokenMap stores them with a 0x prefix
+    return price_id.lower().removeprefix("0x")
+
+def parse_pyth_price(price_id: str, p: dict):
+    """Turns a Hermes 'price' object into a float, "STALE" or None."""
+    if not p:
+        return None
+
+    publish_time = p.get("publish_time")
+    if publish_time is None:
+        return None # Malformed entry: skip the token this cycle, don't prune it
+
+    # Check if stale (e.g., older than 24 hours)
+    if (int(time.time()) - publish_time) > PYTH_STALE_SECONDS:
+        print(f"⚠️ Feed {price_id} is stale.")
+        return "STALE" # Return a unique string to signal deletion
+
+    raw_price = float(p.get("price", 0))
+    expo = int(p.get("expo", 0))
+
+    if raw_price != 0:
+        return raw_price * (10 ** expo)
+    return None
+
 async def fetch_pyth_price(price_id: str, timeout: float = 10.0):
     # Pyth Hermes V2 endpoint
-    url = "https://hermes.pyth.network/v2/updates/price/latest"
+    url = f"{HERMES_URL}/v2/updates/price/latest"
     # Pass params as a dict to let the library handle the [] encoding
     params = {"ids[]": [price_id]}
 
     try:
-        client = await get_client()
-        response = await client.get(url, params=params, timeout=timeout)
+        response = await http_pool.get(url, params=params, timeout=timeout)
         if response.status_code != 200:
             print(f"❌ Pyth Error {response.status_code}: {response.text}")
             return None
@@ -163,19 +209,7 @@ async def fetch_pyth_price(price_id: str, timeout: float = 10.0):
         
         # Safe traversal of the Pyth JSON structure
         if "parsed" in data and len(data["parsed"]) > 0:
-            p = data["parsed"][0].get("price", {})
-            publish_time = p.get("publish_time")
-
-            # Check if stale (e.g., older than 24 hours)
-            if (int(time.time()) - publish_time) > 86400:
-                print(f"⚠️ Feed {price_id} is stale.")
-                return "STALE" # Return a unique string to signal deletion
-
-            raw_price = float(p.get("price", 0))
-            expo = int(p.get("expo", 0))
-
-            if raw_price != 0:
-                return raw_price * (10 ** expo)
+            return parse_pyth_price(price_id, data["parsed"][0].get("price", {}))
         
         return None # Explicitly return None if data is missing
     except httpx.ConnectError:
@@ -186,6 +220,62 @@ async def fetch_pyth_price(price_id: str, timeout: float = 10.0):
         print(f"❌ Unexpected Error during fetch: {type(e).__name__} - {e}")
     return None
 
+async def _fetch_pyth_chunk(price_ids: list, timeout: float):
+    url = f"{HERMES_URL}/v2/updates/price/latest"
+    params = {"ids[]": price_ids, "parsed": "true", "ignore_invalid_price_ids": "true"}
+
+    try:
+        async with pyth_gate:
+            response = await http_pool.get(url, params=params, timeout=timeout)
+    except httpx.ConnectError:
+        print("❌ Connection Error: Could not reach Pyth servers.")
+        return dict.fromkeys(price_ids)
+    except httpx.TimeoutException:
+        print(f"❌ Timeout Error: Pyth took too long to respond for {len(price_ids)} feeds.")
+        return dict.fromkeys(price_ids)
+    except httpx.HTTPError as e:
+        # Protocol, read and pool errors: lose this chunk, not the whole sync
+        print(f"❌ Pyth request failed for {len(price_ids)} feeds ({type(e).__name__}).")
+        return dict.fromkeys(price_ids)
+
+    # A single unknown id fails the whole request, so split the chunk to isolate it
+    if response.status_code in (400, 404) and len(price_ids) > 1:
+        mid = len(price_ids) // 2
+        left, right = await asyncio.gather(
+            _fetch_pyth_chunk(price_ids[:mid], timeout),
+            _fetch_pyth_chunk(price_ids[mid:], timeout)
+        )
+        return {**left, **right}
+
+    if response.status_code != 200:
+        print(f"❌ Pyth Error {response.status_code}: {response.text}")
+        return dict.fromkeys(price_ids)
+
+    try:
+        parsed = response.json().get("parsed", [])
+    except ValueError:
+        print(f"❌ Pyth returned an unreadable body for {len(price_ids)} feeds.")
+        return dict.fromkeys(price_ids)
+
+    feeds = {normalize_feed_id(f.get("id", "")): f.get("price", {}) for f in parsed}
+    return {pid: parse_pyth_price(pid, feeds.get(normalize_feed_id(pid))) for pid in price_ids}
+
+async def fetch_pyth_prices(price_ids: list, chunk_size: int = PYTH_BATCH_SIZE, timeout: float = 10.0):
+    """
+    Batched version of fetch_pyth_price: packs up to `chunk_size` ids[] into each
+    Hermes request and runs the chunks concurrently.
+    Returns {price_id: price | "STALE" | None} for every id passed in.
+    """
+    ids = list(dict.fromkeys(pid for pid in price_ids if pid))
+    chunks = [ids[i:i + chunk_size] for i in range(0, len(ids), chunk_size)]
+
+    results = await asyncio.gather(*(_fetch_pyth_chunk(chunk, timeout) for chunk in chunks))
+
+    prices = {}
+    for result in results:
+        prices.update(result)
+    return prices
+
 api_semaphore = asyncio.Semaphore(2)
 async def fetch_dex_whales(address: str):
     """
@@ -199,38 +289,37 @@ async def fetch_dex_whales(address: str):
     
     async with api_semaphore: # Ensuring we stay within the 300 req/min limit
         try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                response = await client.get(url)
-                if response.status_code != 200:
-                    return None
-                    
-                data = response.json()
-                pairs = data.get('pairs', [])
-                
-                if not pairs:
-                    return None
-                
-                # We want the 'Main' pair (usually the one with the most liquidity)
-                # This helps us avoid 'dust' pools or fake liquidity.
-                main_pair = max(pairs, key=lambda x: float(x.get('liquidity', {}).get('usd', 0)))
+            response = await http_pool.get(url)
+            if response.status_code != 200:
+                return None
                 
-                # Extract 24h volume and transaction counts
-                volume_24h = float(main_pair.get('volume', {}).get('h24', 0))
-                txns_24h = main_pair.get('txns', {}).get('h24', {})
-                buys = txns_24h.get('buys', 0)
-                sells = txns_24h.get('sells', 0)
-
-                # Determine flow type based on buy/sell pressure
-                flow_type = "Whale Swap"
-                if buys > (sells * 1.5):
-                    flow_type = "Cold Storage"    # Strong buying = Accumulation
-                elif sells > (buys * 1.5):
-                    flow_type = "Exchange Inflow" # Strong selling = Distribution
-
-                return {
-                    "type": flow_type,
-                    "amount": volume_24h / 100 # Normalized volume "score"
-                }
+            data = response.json()
+            pairs = data.get('pairs', [])
+            
+            if not pairs:
+                return None
+            
+            # We want the 'Main' pair (usually the one with the most liquidity)
+            # This helps us avoid 'dust' pools or fake liquidity.
+            main_pair = max(pairs, key=lambda x: float(x.get('liquidity', {}).get('usd', 0)))
+            
+            # Extract 24h volume and transaction counts
+            volume_24h = float(main_pair.get('volume', {}).get('h24', 0))
+            txns_24h = main_pair.get('txns', {}).get('h24', {})
+            buys = txns_24h.get('buys', 0)
+            sells = txns_24h.get('sells', 0)
+
+            # Determine flow type based on buy/sell pressure
+            flow_type = "Whale Swap"
+            if buys > (sells * 1.5):
+                flow_type = "Cold Storage"    # Strong buying = Accumulation
+            elif sells > (buys * 1.5):
+                flow_type = "Exchange Inflow" # Strong selling = Distribution
+
+            return {
+                "type": flow_type,
+                "amount": volume_24h / 100 # Normalized volume "score"
+            }
         except Exception as e:
             print(f"⚠️ DexScreener Error for {address}: {e}")
     return None
@@ -271,33 +360,39 @@ def map_to_investor_behavior(symbol, flow_type, volume):
         "timestamp": datetime.now()
     }
 
-def mine_investor_behavior(db, symbol: str):
-    """
-    Mines the database for whale activity in the last 24 hours.
-    Returns a behavioral context string for Lucy's brain.
-    """
-    one_day_ago = func.now() - timedelta(hours=24)
-
-    avg_vol = db.query(func.avg(InvestorBehavior.volume)).filter(
-        InvestorBehavior.symbol == symbol,
-        InvestorBehavior.timestamp >= one_day_ago
-    ).scalar() or 0
-
+def _behavior_stmt(symbols: list):
+    """Per-symbol, per-flow-type volume sums and counts over the last 24 hours, in one GROUP BY."""
+    one_day_ago = datetime.now() - timedelta(hours=24)
+    return (
+        select(
+            InvestorBehavior.symbol,
+            InvestorBehavior.flow_type,
+            func.sum(InvestorBehavior.volume).label("volume"),
+            func.count(InvestorBehavior.volume).label("moves")
+        )
+        .where(InvestorBehavior.symbol.in_(symbols), InvestorBehavior.timestamp >= one_day_ago)
+        .group_by(InvestorBehavior.symbol, InvestorBehavior.flow_type)
+    )
+
+def _behavior_contexts(rows, symbols: list):
+    totals = {symbol: {"volume": 0.0, "moves": 0, "flows": {}} for symbol in symbols}
+    for row in rows:
+        t = totals[row.symbol]
+        t["volume"] += float(row.volume or 0)
+        t["moves"] += row.moves
+        t["flows"][row.flow_type] = float(row.volume or 0)
+
+    contexts = {}
+    for symbol, t in totals.items():
+        avg_vol = t["volume"] / t["moves"] if t["moves"] else 0
+        # Net Flow inputs: Inflows (selling) vs Cold Storage (buying)
+        contexts[symbol] = classify_behavior(avg_vol, t["flows"].get("Exchange Inflow", 0), t["flows"].get("Cold Storage", 0))
+    return contexts
+
+def classify_behavior(avg_vol, inflows, outflows):
+    """Turns 24h whale volumes into the behavioral context string for Lucy's brain."""
+    avg_vol, inflows, outflows = float(avg_vol or 0), float(inflows or 0), float(outflows or 0)
     dynamic_threshold = max(avg_vol * 2.0, 100)
-    
-    # Query for Net Flow (Inflows - Outflows)
-    inflows = db.query(func.sum(InvestorBehavior.volume)).filter(
-        InvestorBehavior.symbol == symbol,
-        InvestorBehavior.flow_type == "Exchange Inflow",
-        InvestorBehavior.timestamp >= one_day_ago
-    ).scalar() or 0
-
-    outflows = db.query(func.sum(InvestorBehavior.volume)).filter(
-        InvestorBehavior.symbol == symbol,
-        InvestorBehavior.flow_type == "Cold Storage",
-        InvestorBehavior.timestamp >= one_day_ago
-    ).scalar() or 0
-
     net_flow = inflows - outflows
 
     # Classify the behavior
@@ -308,4 +403,26 @@ def mine_investor_behavior(db, symbol: str):
     elif net_flow < -dynamic_threshold:
         return "Strong Accumulation (Whales Buying)"
     else:
-        return "Neutral Sideways Movement"
\ No newline at end of file
+        return "Neutral Sideways Movement"
+
+def mine_investor_behavior(db, symbol: str):
+    """
+    Mines the database for whale activity in the last 24 hours.
+    Returns a behavioral context string for Lucy's brain.
+    """
+    return mine_investor_behavior_many(db, [symbol])[symbol]
+
+def mine_investor_behavior_many(db, symbols: list):
+    """Behavioral contexts for many symbols from a single grouped query."""
+    symbols = list(symbols)
+    rows = db.execute(_behavior_stmt(symbols)).all()
+    return _behavior_contexts(rows, symbols)
+
+async def mine_investor_behavior_async(db, symbol: str):
+    """Async twin of mine_investor_behavior for AsyncSession callers."""
+    return (await mine_investor_behavior_many_async(db, [symbol]))[symbol]
+
+async def mine_investor_behavior_many_async(db, symbols: list):
+    symbols = list(symbols)
+    rows = (await db.execute(_behavior_stmt(symbols))).all()
+    return _behavior_contexts(rows, symbols)
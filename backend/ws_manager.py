@@ -0,0 +1,291 @@
+import asyncio
+import json
+import os
+import time
+from collections import deque
+import msgpack
+from fastapi import WebSocket
+
+WS_QUEUE_SIZE = int(os.getenv("WS_QUEUE_SIZE", 256))
+WS_SLOW_CLIENT_POLICY = os.getenv("WS_SLOW_CLIENT_POLICY", "drop_oldest")  # or "disconnect"
+
+# "json" keeps the original text framing; "msgpack" sends each payload as one binary frame
+PROTOCOLS = ("json", "msgpack")
+# Types that the original dashboard does not understand, only sent to clients that ask for them
+OPT_IN_TYPES = {"tickers"}
+# Types the original dashboard reads from inside the legacy {"type": "thought", "content": ...} wrapper
+LEGACY_TYPES = {"thought", "insight_update", "agent_stats"}
+
+class ClientConnection:
+    """One socket with its own bounded outbox, drained by a dedicated writer task."""
+    def __init__(self, websocket: WebSocket, protocol: str = "json"):
+        self.websocket = websocket
+        self.protocol = protocol
+        self.outbox = deque()          # (enqueued_at, payload)
+        self.ready = asyncio.Event()
+        self.writer: asyncio.Task = None
+        self.sent = 0
+        self.dropped = 0
+        self.max_lag = 0.0             # Worst enqueue -> delivered delay seen, in seconds
+        self.symbols: set[str] = None  # None = every symbol
+        self.types: set[str] = None    # None = every message type
+        self.ticker_version = None     # Last ticker snapshot this client holds; None = needs a full one
+
+    def wants_type(self, msg_type: str):
+        if self.types is None:
+            return msg_type not in OPT_IN_TYPES
+        return msg_type in self.types
+
+    def oldest_age(self, now: float):
+        return (now - self.outbox[0][0]) if self.outbox else 0.0
+
+class ConnectionManager:
+    """
+    Fan-out for the Thought Stream. broadcast() only enqueues; every client has its own
+    writer, so a slow socket delays nobody but itself. A full outbox either drops its
+    oldest message or disconnects the client, depending on `slow_client_policy`.
+    """
+    def __init__(self, queue_size: int = WS_QUEUE_SIZE, slow_client_policy: str = WS_SLOW_CLIENT_POLICY):
+        self.queue_size = queue_size
+        self.slow_client_policy = slow_client_policy
+        self.active_connections: dict[WebSocket, ClientConnection] = {}
+        self.counters = {"sent": 0, "dropped": 0, "slow_disconnects": 0, "send_errors": 0}
+        # Topic index: symbol -> subscribed clients, plus the clients that want every symbol
+        self.by_symbol: dict[str, set[ClientConnection]] = {}
+        self.any_symbol: set[ClientConnection] = set()
+        self.ticker_snapshot = None
+
+    async def connect(self, websocket: WebSocket, protocol: str = "json"):
+        await websocket.accept()
+        client = ClientConnection(websocket, protocol if protocol in PROTOCOLS else "json")
+        client.writer = asyncio.create_task(self._writer(client))
+        self.active_connections[websocket] = client
+        self.any_symbol.add(client)
+
+    def disconnect(self, websocket: WebSocket):
+        client = self.active_connections.pop(websocket, None)
+        if not client:
+            return
+        self._unindex(client)
+        if client.writer is not asyncio.current_task():
+            client.writer.cancel()
+
+    def _unindex(self, client: ClientConnection):
+        self.any_symbol.discard(client)
+        for symbol in client.symbols or ():
+            subscribers = self.by_symbol.get(symbol)
+            if subscribers is not None:
+                subscribers.discard(client)
+                if not subscribers:
+                    del self.by_symbol[symbol]
+
+    def _index(self, client: ClientConnection):
+        if client.symbols is None:
+            self.any_symbol.add(client)
+            return
+        for symbol in client.symbols:
+            self.by_symbol.setdefault(symbol, set()).add(client)
+
+    def handle_message(self, websocket: WebSocket, data: str | bytes):
+        """
+        Applies a client control message, sent as JSON text or a msgpack binary frame:
+        {"action": "subscribe" | "unsubscribe", "symbols": [...] | "*", "types": [...] | "*"}
+        {"action": "hello", "protocol": "json" | "msgpack"}
+        A fresh connection receives everything except opt-in types until its first subscribe;
+        "*" resets a filter to everything (or nothing, on unsubscribe). Malformed frames are ignored.
+        """
+        client = self.active_connections.get(websocket)
+        if client is None:
+            return
+        try:
+            message = msgpack.unpackb(data) if isinstance(data, bytes) else json.loads(data)
+            action = message.get("action")
+        except (ValueError, TypeError, AttributeError, msgpack.UnpackException):
+            return # Keep-alive pings and free text are not control messages
+        if action == "hello":
+            if message.get("protocol") in PROTOCOLS:
+                client.protocol = message["protocol"]
+            self._enqueue(client, self._encode({"type": "hello", "protocol": client.protocol}, client.protocol))
+            return
+        if action not in ("subscribe", "unsubscribe"):
+            return
+        symbols, types = message.get("symbols"), message.get("types")
+        if not (self._valid_filter(symbols) and self._valid_filter(types)):
+            return
+
+        self._unindex(client)
+        if symbols is not None:
+            client.symbols = self._apply_filter(action, client.symbols, symbols, str.upper)
+        if types is not None:
+            client.types = self._apply_filter(action, client.types, types, str)
+        self._index(client)
+        # A changed symbol filter invalidates the ticker state the client holds; resync it in full
+        client.ticker_version = None
+
+        self._enqueue(client, self._encode({
+            "type": "subscription",
+            "symbols": sorted(client.symbols) if client.symbols is not None else "*",
+            "types": sorted(client.types) if client.types is not None else "*"
+        }, client.protocol))
+
+    @staticmethod
+    def _valid_filter(requested):
+        """None (unchanged), "*", one string or a list of strings."""
+        if requested is None or isinstance(requested, str):
+            return True
+        return isinstance(requested, list) and all(isinstance(item, str) for item in requested)
+
+    @staticmethod
+    def _apply_filter(action: str, current: set, requested, normalize):
+        if requested == "*":
+            return None if action == "subscribe" else set()
+        if isinstance(requested, str):
+            requested = [requested]
+        requested = {normalize(item) for item in requested}
+        if action == "subscribe":
+            # The first subscription narrows a "receive everything" connection down to what was asked for
+            return requested if current is None else current | requested
+        # Unsubscribing from a "receive everything" filter is not expressible as a set; leave it alone
+        return None if current is None else current - requested
+
+    async def _writer(self, client: ClientConnection):
+        try:
+            while True:
+                if not client.outbox:
+                    client.ready.clear()
+                    await client.ready.wait()
+                    continue
+
+                enqueued_at, payload = client.outbox.popleft()
+                if isinstance(payload, bytes):
+                    await client.websocket.send_bytes(payload)
+                else:
+                    await client.websocket.send_text(payload)
+
+                client.sent += 1
+                client.max_lag = max(client.max_lag, time.monotonic() - enqueued_at)
+                self.counters["sent"] += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Dead socket: stop fanning out to it instead of failing silently forever
+            self.counters["send_errors"] += 1
+            self.disconnect(client.websocket)
+
+    def _enqueue(self, client: ClientConnection, payload):
+        if len(client.outbox) >= self.queue_size:
+            if self.slow_client_policy == "disconnect":
+                self.counters["slow_disconnects"] += 1
+                self.disconnect(client.websocket)
+                asyncio.create_task(self._close(client.websocket))
+                return
+            client.outbox.popleft()
+            client.dropped += 1
+            client.ticker_version = None # The dropped frame may have been a ticker delta; resync in full
+            self.counters["dropped"] += 1
+
+        client.outbox.append((time.monotonic(), payload))
+        client.ready.set()
+
+    async def _close(self, websocket: WebSocket):
+        try:
+            await websocket.close(code=1013) # Try again later
+        except Exception:
+            pass
+
+    def _recipients(self, msg_type: str, symbol: str = None):
+        if symbol is None:
+            candidates = self.active_connections.values()
+        else:
+            candidates = self.any_symbol | self.by_symbol.get(symbol, set())
+        return [client for client in candidates if client.wants_type(msg_type)]
+
+    @staticmethod
+    def _encode(message: dict, protocol: str):
+        if protocol == "msgpack":
+            return msgpack.packb(message, use_bin_type=True)
+        if message.get("type") in LEGACY_TYPES and message.get("type") != "thought":
+            # The original dashboard parses these out of a JSON string nested in a thought
+            return json.dumps({"type": "thought", "content": json.dumps(message)})
+        return json.dumps(message)
+
+    def _fan_out(self, message: dict, recipients):
+        # Serialized once per protocol, however many sockets it fans out to
+        frames = {}
+        for client in recipients:
+            if client.protocol not in frames:
+                frames[client.protocol] = self._encode(message, client.protocol)
+            self._enqueue(client, frames[client.protocol])
+
+    async def broadcast(self, message: str):
+        # Sending a structured "thought"; enqueued for every client, never awaited on a socket
+        self._fan_out({"type": "thought", "content": message}, self._recipients("thought"))
+
+    async def publish(self, message: dict):
+        """Routes a typed payload (insight_update, agent_stats, ...) to the clients subscribed to its topic."""
+        self._fan_out(message, self._recipients(message.get("type", "thought"), message.get("symbol")))
+
+    async def publish_tickers(self, snapshot):
+        """
+        Pushes a TickerBoard snapshot to clients subscribed to "tickers". A client holding the
+        previous version gets only the symbols and fields that changed; anyone else gets a full frame.
+        """
+        previous = self.ticker_snapshot
+        if previous is not None and previous.version == snapshot.version:
+            return
+        self.ticker_snapshot = snapshot
+
+        delta = None
+        frames = {}
+        for client in self._recipients("tickers"):
+            is_delta = previous is not None and client.ticker_version == previous.version
+            if is_delta and delta is None:
+                delta = ticker_delta(previous.tickers, snapshot.tickers)
+
+            key = (is_delta, client.protocol, frozenset(client.symbols) if client.symbols is not None else None)
+            if key not in frames:
+                changed, removed = delta if is_delta else (snapshot.tickers, [])
+                if client.symbols is not None:
+                    changed = {s: row for s, row in changed.items() if s in client.symbols}
+                    removed = [s for s in removed if s in client.symbols]
+                # An empty delta still goes out so every frame's `base` is the version the client holds
+                frames[key] = self._encode({
+                    "type": "tickers",
+                    "version": snapshot.version,
+                    "base": previous.version if is_delta else None,
+                    "changed": changed,
+                    "removed": removed
+                }, client.protocol)
+
+            dropped = client.dropped
+            self._enqueue(client, frames[key])
+            # A drop may have taken an earlier ticker frame; _enqueue already marked the client for a full resync
+            if client.dropped == dropped:
+                client.ticker_version = snapshot.version
+
+    def stats(self):
+        """Fan-out health: queue depth, lag and drop counts across connected clients."""
+        now = time.monotonic()
+        clients = list(self.active_connections.values())
+        return {
+            "clients": len(clients),
+            "binary_clients": sum(c.protocol == "msgpack" for c in clients),
+            "topics": len(self.by_symbol),
+            "policy": self.slow_client_policy,
+            "queued": sum(len(c.outbox) for c in clients),
+            "max_queue_lag_ms": round(max((c.oldest_age(now) for c in clients), default=0.0) * 1000, 1),
+            "max_send_lag_ms": round(max((c.max_lag for c in clients), default=0.0) * 1000, 1),
+            **self.counters
+        }
+
+def ticker_delta(old: dict, new: dict):
+    """({symbol: changed fields}, [removed symbols]) between two {symbol: {"price", "change"}} maps."""
+    changed = {}
+    for symbol, row in new.items():
+        before = old.get(symbol)
+        if before is None:
+            changed[symbol] = row
+        elif before != row:
+            changed[symbol] = {field: value for field, value in row.items() if before.get(field) != value}
+    removed = [symbol for symbol in old if symbol not in new]
+    return changed, removed